@@ -0,0 +1,317 @@
+"""
+A local stand-in for the Census Geocoder, for benchmarks.
+
+    python benchmarks/fake_census.py --port 8765 --latency 0.05 --error-rate 0.01
+
+It answers GET /geocoder/{locations,geographies}/{onelineaddress,address,coordinates}
+and POST /geocoder/{locations,geographies}/addressbatch with responses shaped like the
+real service's. Latency, error rate, match rate and the size of geography payloads can
+be configured. Point a client at it with `local_geocoder(url)`.
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import multiprocessing
+import os
+import random
+import sys
+import zlib
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from async_censusgeocode import AsyncCensusGeocode  # noqa: E402
+
+LAYER_NAMES = [
+    "2020 Census Blocks",
+    "Census Tracts",
+    "Census Block Groups",
+    "Counties",
+    "County Subdivisions",
+    "Incorporated Places",
+    "States",
+    "Urban Areas",
+    "Combined Statistical Areas",
+    "Metropolitan Statistical Areas",
+    "119th Congressional Districts",
+    "2024 State Legislative Districts - Upper",
+    "2024 State Legislative Districts - Lower",
+    "Unified School Districts",
+    "Census Designated Places",
+    "ZIP Code Tabulation Areas",
+]
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 503: "Service Unavailable"}
+
+
+class FakeCensus:
+    """
+    Arguments:
+        latency (float): Seconds to wait before answering each request.
+        jitter (float): Up to this many seconds are added to the latency at random.
+        row_latency (float): Extra seconds per row of a batch upload.
+        error_rate (float): Fraction of requests answered with a 503.
+        match_rate (float): Fraction of addresses that match. A twentieth of the rest
+            are ties.
+        layers (int): Number of geography layers in geographies responses.
+        attributes (int): Number of attributes of each geography.
+        seed (int): Seed for latency jitter and errors.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        row_latency=0.0,
+        error_rate=0.0,
+        match_rate=0.9,
+        layers=12,
+        attributes=24,
+        seed=0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.row_latency = row_latency
+        self.error_rate = error_rate
+        self.match_rate = match_rate
+        self.layers = LAYER_NAMES[:layers]
+        self.attributes = attributes
+        self.random = random.Random(seed)
+        self.requests = 0
+
+    def geography(self, layer, n):
+        geography = {
+            "GEOID": "3606100010{:05d}".format(n),
+            "NAME": "{} {}".format(layer, n),
+            "STATE": "36",
+            "COUNTY": "061",
+            "TRACT": "000100",
+            "BLOCK": "{:04d}".format(n % 10000),
+            "CENTLON": "-073.9{:06d}".format(n % 1000000),
+            "CENTLAT": "+40.7{:06d}".format(n % 1000000),
+            "INTPTLON": "-073.9{:06d}".format(n % 1000000),
+            "INTPTLAT": "+40.7{:06d}".format(n % 1000000),
+            "OBJECTID": n,
+        }
+        for i in range(len(geography), self.attributes):
+            geography["ATTR{}".format(i)] = "value {}".format(i)
+        return geography
+
+    def geographies(self, n):
+        return {layer: [self.geography(layer, n)] for layer in self.layers}
+
+    def status(self, address):
+        """Match, No_Match or Tie, fixed for each address"""
+        draw = (zlib.crc32(address.encode("utf-8")) % 10000) / 10000
+        if draw < self.match_rate:
+            return "Match"
+        if draw < self.match_rate + (1 - self.match_rate) / 20:
+            return "Tie"
+        return "No_Match"
+
+    def lookup(self, returntype, searchtype, params):
+        """Body of a onelineaddress, address or coordinates response"""
+        if searchtype == "coordinates":
+            result = {
+                "input": {"location": {"x": params.get("x"), "y": params.get("y")}}
+            }
+            result["geographies"] = self.geographies(self.requests)
+            return json.dumps({"result": result})
+
+        address = params.get("address") or " ".join(
+            params.get(k, "") for k in ("street", "city", "state", "zip")
+        )
+        matches = []
+        if self.status(address) == "Match":
+            match = {
+                "matchedAddress": address.upper(),
+                "coordinates": {"x": -73.99, "y": 40.73},
+                "tigerLine": {"tigerLineId": "59653655", "side": "L"},
+                "addressComponents": {"zip": "10011", "city": "NEW YORK"},
+            }
+            if returntype == "geographies":
+                match["geographies"] = self.geographies(self.requests)
+            matches.append(match)
+        return json.dumps({"result": {"input": {}, "addressMatches": matches}})
+
+    def batch(self, returntype, upload):
+        """Body of an addressbatch response, for the CSV text of an upload"""
+        out = io.StringIO()
+        writer = csv.writer(out)
+        rows = [row for row in csv.reader(io.StringIO(upload)) if row]
+        for n, row in enumerate(rows):
+            address = ", ".join(row[1:5])
+            status = self.status(address)
+            if status != "Match":
+                writer.writerow([row[0], address, status])
+                continue
+            line = [row[0], address, "Match", "Exact", address.upper()]
+            line += ["-73.99{},40.73{}".format(n % 10, n % 10), "59653655", "L"]
+            if returntype == "geographies":
+                line += ["36", "061", "000100", "{:04d}".format(n % 10000)]
+            writer.writerow(line)
+        return out.getvalue(), len(rows)
+
+    async def respond(self, method, target, headers, body):
+        """Give the status and body for a request"""
+        self.requests += 1
+        url = urlsplit(target)
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "geocoder":
+            return 404, "text/plain", "not found"
+        returntype, searchtype = parts[1], parts[2]
+
+        rows = 0
+        if searchtype == "addressbatch" and method == "POST":
+            content, rows = self.batch(returntype, _multipart_file(headers, body))
+            content_type = "text/csv"
+        elif method == "GET":
+            params = dict(parse_qsl(url.query))
+            content, content_type = (
+                self.lookup(returntype, searchtype, params),
+                "application/json",
+            )
+        else:
+            return 400, "text/plain", "bad request"
+
+        delay = self.latency + self.row_latency * rows
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return 503, "text/plain", "unavailable"
+        return 200, content_type, content
+
+    async def handle(self, reader, writer):
+        """Serve HTTP/1.1 requests on one keep-alive connection"""
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if line:
+                        name, _, value = line.partition(":")
+                        headers[name.strip().lower()] = value.strip()
+
+                if headers.get("transfer-encoding") == "chunked":
+                    body = await _read_chunked(reader)
+                else:
+                    body = await reader.readexactly(
+                        int(headers.get("content-length", 0))
+                    )
+
+                status, content_type, content = await self.respond(
+                    method, target, headers, body
+                )
+                content = content.encode("utf-8")
+                writer.write(
+                    "HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n\r\n".format(
+                        status, REASONS[status], content_type, len(content)
+                    ).encode(
+                        "latin-1"
+                    )
+                    + content
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=0):
+        """Start serving. Returns the asyncio server and the base URL."""
+        server = await asyncio.start_server(self.handle, host, port, limit=2**20)
+        port = server.sockets[0].getsockname()[1]
+        return server, "http://{}:{}".format(host, port)
+
+
+async def _read_chunked(reader):
+    body = bytearray()
+    while True:
+        size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+        if size == 0:
+            await reader.readuntil(b"\r\n")
+            return bytes(body)
+        body += await reader.readexactly(size)
+        await reader.readexactly(2)
+
+
+def _multipart_file(headers, body):
+    """Text of the addressFile part of a multipart/form-data body"""
+    boundary = headers["content-type"].split("boundary=", 1)[1].encode("latin-1")
+    for part in body.split(b"--" + boundary):
+        head, _, content = part.partition(b"\r\n\r\n")
+        if b'name="addressFile"' in head:
+            return content[: -len(b"\r\n")].decode("utf-8")
+    return ""
+
+
+def local_geocoder(url, **kwargs):
+    """An AsyncCensusGeocode sending its requests to a fake Census at url"""
+    geocoder = AsyncCensusGeocode(**kwargs)
+    geocoder._url = url + "/geocoder/{returntype}/{searchtype}"
+    return geocoder
+
+
+def _run(options, port, ready):
+    async def main():
+        server, url = await FakeCensus(**options).serve(port=port)
+        ready.put(url)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def start_process(port=0, **options):
+    """Run a FakeCensus in a child process. Returns its URL and the process."""
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_run, args=(options, port, ready), daemon=True
+    )
+    process.start()
+    return ready.get(timeout=30), process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--row-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--match-rate", type=float, default=0.9)
+    parser.add_argument("--layers", type=int, default=12)
+    parser.add_argument("--attributes", type=int, default=24)
+    args = parser.parse_args()
+
+    fake = FakeCensus(
+        latency=args.latency,
+        jitter=args.jitter,
+        row_latency=args.row_latency,
+        error_rate=args.error_rate,
+        match_rate=args.match_rate,
+        layers=args.layers,
+        attributes=args.attributes,
+    )
+
+    async def serve():
+        server, url = await fake.serve(args.host, args.port)
+        print("Serving a fake Census Geocoder at {}/geocoder/".format(url))
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
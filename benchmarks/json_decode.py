@@ -0,0 +1,124 @@
+"""
+Time decoding a geographies response with each available JSON decoder.
+
+    python benchmarks/json_decode.py [number]
+
+"decode+read" also wraps the result and reads two layers. The payload is shaped like a coordinates() response: every layer the Census returns,
+each geography with the usual couple dozen attributes.
+"""
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from async_censusgeocode import _parse_response, schema_decoder  # noqa: E402
+
+LAYERS = [
+    "2020 Census Blocks",
+    "Census Tracts",
+    "Census Block Groups",
+    "Counties",
+    "County Subdivisions",
+    "Incorporated Places",
+    "States",
+    "Urban Areas",
+    "Combined Statistical Areas",
+    "Metropolitan Statistical Areas",
+    "119th Congressional Districts",
+    "2024 State Legislative Districts - Upper",
+    "2024 State Legislative Districts - Lower",
+    "Unified School Districts",
+    "Census Designated Places",
+    "ZIP Code Tabulation Areas",
+]
+
+
+def geography(n):
+    return {
+        "GEOID": "42079216600{:04d}".format(n),
+        "CENTLAT": "+40.9957436",
+        "CENTLON": "-076.0089338",
+        "INTPTLAT": "+40.9957436",
+        "INTPTLON": "-076.0089338",
+        "AREALAND": 123456 + n,
+        "AREAWATER": 0,
+        "BASENAME": "Geography {}".format(n),
+        "NAME": "Geography {} of the benchmark payload".format(n),
+        "OBJECTID": 9940449 + n,
+        "OID": 210404020212114 + n,
+        "STATE": "42",
+        "COUNTY": "079",
+        "TRACT": "216600",
+        "BLKGRP": "1",
+        "BLOCK": "1045",
+        "FUNCSTAT": "S",
+        "LSADC": "BK",
+        "MTFCC": "G5040",
+        "UR": "",
+        "UA": "",
+        "STATENS": "01779798",
+        "POP100": 35 + n,
+        "HU100": 12 + n,
+        "SUFFIX": "",
+    }
+
+
+PAYLOAD = json.dumps(
+    {
+        "result": {
+            "input": {
+                "location": {"x": -76.0, "y": 41.0},
+                "benchmark": {"benchmarkName": "Public_AR_Current"},
+                "vintage": {"vintageName": "Current_Current"},
+            },
+            "geographies": {name: [geography(i)] for i, name in enumerate(LAYERS)},
+        }
+    }
+).encode()
+
+
+def decoders():
+    yield "json", json.loads
+    try:
+        import orjson
+
+        yield "orjson", orjson.loads
+    except ImportError:
+        pass
+    try:
+        import msgspec
+
+        yield "msgspec", msgspec.json.decode
+        yield "msgspec schema", schema_decoder(
+            layers=["Census Tracts", "2020 Census Blocks"],
+            attributes=["GEOID", "TRACT", "BLOCK"],
+        )
+    except ImportError:
+        pass
+
+
+def main(number=5000):
+    print("payload: {:,} bytes, {} layers".format(len(PAYLOAD), len(LAYERS)))
+    print("{:<16} {:>12} {:>16}".format("decoder", "decode (us)", "decode+read (us)"))
+    for name, decode in decoders():
+        decode_only = min(
+            timeit.repeat(lambda: decode(PAYLOAD), number=number, repeat=5)
+        )
+
+        def full():
+            result = _parse_response(decode(PAYLOAD))
+            return result["Census Tracts"], result["2020 Census Blocks"]
+
+        parsed = min(timeit.repeat(full, number=number, repeat=5))
+        print(
+            "{:<16} {:>12.1f} {:>16.1f}".format(
+                name, decode_only / number * 1e6, parsed / number * 1e6
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,247 @@
+"""
+Benchmark suite, run against a local fake Census Geocoder.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --compare results.json
+
+Measures single lookup throughput and latency, batch throughput and peak memory, and
+the CPU time of parsing batch and geographies responses. Results are written as JSON,
+and --compare prints the ratio of each metric to an earlier run. With --error-rate,
+failed lookups are counted under lookups.errors and failed batch chunks are retried.
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_census import FakeCensus, local_geocoder, start_process  # noqa: E402
+
+from async_censusgeocode import (  # noqa: E402
+    AsyncCensusGeocode,
+    GeographyResult,
+    RetryPolicy,
+)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def bench_lookups(url, requests, concurrency):
+    """Requests per second and latency of onelineaddress lookups"""
+    latencies = []
+    addresses = ["{} Main St, Springfield, IL".format(i) for i in range(requests)]
+
+    async def timed(addresses):
+        # Lookups start as geocode_many reads the next address
+        for address in addresses:
+            started[address] = time.perf_counter()
+            yield address
+
+    async with local_geocoder(url) as acg:
+        started, errors = {}, 0
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        async for address, result in acg.geocode_many(
+            timed(addresses), concurrency, ordered=False, returntype="geographies"
+        ):
+            latencies.append(time.perf_counter() - started.pop(address))
+            # Failed lookups (e.g. with --error-rate) are counted, not raised
+            errors += isinstance(result, Exception)
+        elapsed = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "requests_per_sec": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "cpu_ms_per_request": cpu / requests * 1000,
+    }
+
+
+def batch_rows(rows):
+    return [
+        {"street": "{} Main St".format(i), "city": "Springfield", "state": "IL"}
+        for i in range(rows)
+    ]
+
+
+def batch_retry():
+    """Retry failed chunks (e.g. with --error-rate), so every batch completes"""
+    return RetryPolicy(attempts=10, backoff=0.01)
+
+
+async def bench_batch(url, rows, chunksize, concurrency, compact=False):
+    """Rows per second of addressbatch"""
+    data = batch_rows(rows)
+    retry = batch_retry()
+    async with local_geocoder(url, retry=retry) as acg:
+        started = time.perf_counter()
+        cpu = time.process_time()
+        result = await acg.addressbatch(
+            data, chunksize=chunksize, concurrency=concurrency, compact=compact
+        )
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu
+    assert len(result) == rows
+    return {
+        "rows": rows,
+        "retries": retry.retries,
+        "rows_per_sec": rows / elapsed,
+        "cpu_us_per_row": cpu / rows * 1e6,
+    }
+
+
+async def bench_batch_memory(url, rows, chunksize, concurrency, compact=False):
+    """Peak Python memory of addressbatch, input excluded"""
+    data = batch_rows(rows)
+    async with local_geocoder(url, retry=batch_retry()) as acg:
+        tracemalloc.start()
+        result = await acg.addressbatch(
+            data, chunksize=chunksize, concurrency=concurrency, compact=compact
+        )
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    assert len(result) == rows
+    return {"rows": rows, "peak_mib": peak / 2**20}
+
+
+def cpu_time(func, number):
+    started = time.process_time()
+    for _ in range(number):
+        func()
+    return (time.process_time() - started) / number
+
+
+def bench_parsing(number):
+    """CPU time of _parse_batch_result and GeographyResult on fake responses"""
+    fake = FakeCensus(layers=16, attributes=24)
+    upload = io.StringIO()
+    csv.writer(upload).writerows(
+        [i, "{} Main St".format(i), "Springfield", "IL", ""] for i in range(10000)
+    )
+    text, _ = fake.batch("geographies", upload.getvalue())
+    payload = json.loads(fake.lookup("geographies", "coordinates", {"x": 1, "y": 2}))
+    acg = AsyncCensusGeocode()
+
+    def geography_result():
+        result = GeographyResult(json.loads(json.dumps(payload)))
+        return result["Census Tracts"], result["2020 Census Blocks"]
+
+    def geography_result_all():
+        return list(GeographyResult(json.loads(json.dumps(payload))).values())
+
+    return {
+        "parse_batch_result_ms_per_10k": cpu_time(
+            lambda: acg._parse_batch_result(text, "geographies"), max(1, number // 100)
+        )
+        * 1000,
+        "geography_result_us": cpu_time(geography_result, number) * 1e6,
+        "geography_result_all_layers_us": cpu_time(geography_result_all, number) * 1e6,
+    }
+
+
+async def run_all(url, args):
+    return {
+        "lookups": await bench_lookups(url, args.requests, args.concurrency),
+        "batch": await bench_batch(
+            url, args.batch_rows, args.chunk_size, args.batch_concurrency
+        ),
+        "batch_compact": await bench_batch(
+            url, args.batch_rows, args.chunk_size, args.batch_concurrency, True
+        ),
+        "batch_memory": await bench_batch_memory(
+            url, args.batch_rows, args.chunk_size, args.batch_concurrency
+        ),
+        "batch_compact_memory": await bench_batch_memory(
+            url, args.batch_rows, args.chunk_size, args.batch_concurrency, True
+        ),
+        "parsing": bench_parsing(args.parse_number),
+    }
+
+
+def flatten(results, prefix=""):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from flatten(value, prefix + key + ".")
+        else:
+            yield prefix + key, value
+
+
+def compare(results, baseline):
+    old = dict(flatten(baseline["results"]))
+    print("{:<48} {:>14} {:>14} {:>8}".format("metric", "baseline", "current", "ratio"))
+    for name, value in flatten(results):
+        if name in old and old[name]:
+            print(
+                "{:<48} {:>14.2f} {:>14.2f} {:>8.2f}".format(
+                    name, old[name], value, value / old[name]
+                )
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-rows", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--batch-concurrency", type=int, default=4)
+    parser.add_argument("--parse-number", type=int, default=2000)
+    parser.add_argument(
+        "--latency", type=float, default=0.005, help="fake server latency"
+    )
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--layers", type=int, default=12)
+    parser.add_argument("--attributes", type=int, default=24)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument(
+        "--compare", help="JSON results of an earlier run to compare with"
+    )
+    args = parser.parse_args()
+
+    url, server = start_process(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        layers=args.layers,
+        attributes=args.attributes,
+    )
+    try:
+        results = asyncio.run(run_all(url, args))
+    finally:
+        server.terminate()
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    else:
+        for name, value in flatten(results):
+            print("{:<48} {:>14.2f}".format(name, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,45 @@
 # http://opensource.org/licenses/LGPL-3.0
 # Copyright (c) 2025, Bryan Corder <contact@fakeisthenewreal.org>
 
-from .async_censusgeocode import AsyncCensusGeocode
+from .async_censusgeocode import (
+    AdaptiveLimiter,
+    AsyncCensusGeocode,
+    BatchJournal,
+    BatchResult,
+    BoundaryIndex,
+    CensusGeocode,
+    MemoryCache,
+    MetricsCollector,
+    MicroBatch,
+    OpenTelemetryHook,
+    ReplayTransport,
+    RetryPolicy,
+    SQLiteCache,
+    normalize_address,
+    schema_decoder,
+)
 
-acg = AsyncCensusGeocode()
+# The module-level instance and its shortcuts are created on first use, so importing
+# the package stays cheap
+_SHORTCUTS = (
+    "coordinates",
+    "address",
+    "onelineaddress",
+    "addressbatch",
+    "addressbatch_iter",
+    "geocode_many",
+    "coordinates_many",
+    "aclose",
+)
 
-coordinates = acg.coordinates
-address = acg.address
-onelineaddress = acg.onelineaddress
-addressbatch = acg.addressbatch
+
+def __getattr__(name):
+    if name == "acg":
+        return globals().setdefault("acg", AsyncCensusGeocode())
+    if name in _SHORTCUTS:
+        return globals().setdefault(name, getattr(__getattr__("acg"), name))
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | {"acg"} | set(_SHORTCUTS))
@@ -21,15 +21,1571 @@ For details on the API, see:
 http://geocoding.geo.census.gov/geocoder/Geocoding_Services_API.pdf
 """
 
+import bisect
+import contextlib
 import csv
+import functools
+import hashlib
+import importlib
 import io
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
 import warnings
+import zlib
+from array import array
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping, Sequence
 
-from httpx import AsyncClient, RequestError
 
+class _LazyModule:
+    """A module imported on first attribute access, so `import async_censusgeocode`
+    doesn't pay for httpx, asyncio and sqlite3 until they are used"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        # Cache the attribute, so __getattr__ only runs on the first access
+        value = getattr(self._module, attr)
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self):
+        return "<lazy module {!r}>".format(self._name)
+
+
+asyncio = _LazyModule("asyncio")
+httpx = _LazyModule("httpx")
+sqlite3 = _LazyModule("sqlite3")
+logging = _LazyModule("logging")
 
 DEFAULT_BENCHMARK = "Public_AR_Current"
 DEFAULT_VINTAGE = "Current_Current"
+# Geographies layer of census blocks in the current vintages
+BLOCK_LAYER = "2020 Census Blocks"
+
+# "There is currently an upper limit of 10,000 records per batch file."
+BATCH_LIMIT = 10000
+DEFAULT_BATCH_CONCURRENCY = 4
+DEFAULT_CONCURRENCY = 16
+
+
+def _normalize(value):
+    """Canonical form of a request field, so equivalent requests share a cache key"""
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)):
+        return repr(float(value))
+    return " ".join(str(value).split()).upper()
+
+
+# USPS standard abbreviations (Publication 28) for common street suffixes, directionals
+# and secondary unit designators
+STREET_SUFFIXES = {
+    "ALLEY": "ALY",
+    "AVENUE": "AVE",
+    "BOULEVARD": "BLVD",
+    "CIRCLE": "CIR",
+    "COURT": "CT",
+    "DRIVE": "DR",
+    "EXPRESSWAY": "EXPY",
+    "FREEWAY": "FWY",
+    "HIGHWAY": "HWY",
+    "LANE": "LN",
+    "PARKWAY": "PKWY",
+    "PLACE": "PL",
+    "PLAZA": "PLZ",
+    "ROAD": "RD",
+    "ROUTE": "RTE",
+    "SQUARE": "SQ",
+    "STREET": "ST",
+    "TERRACE": "TER",
+    "TRAIL": "TRL",
+    "TURNPIKE": "TPKE",
+}
+
+DIRECTIONALS = {
+    "NORTH": "N",
+    "SOUTH": "S",
+    "EAST": "E",
+    "WEST": "W",
+    "NORTHEAST": "NE",
+    "NORTHWEST": "NW",
+    "SOUTHEAST": "SE",
+    "SOUTHWEST": "SW",
+}
+
+UNIT_DESIGNATORS = {
+    "APARTMENT": "APT",
+    "SUITE": "STE",
+}
+
+STATE_ABBREVIATIONS = {
+    "ALABAMA": "AL",
+    "ALASKA": "AK",
+    "ARIZONA": "AZ",
+    "ARKANSAS": "AR",
+    "CALIFORNIA": "CA",
+    "COLORADO": "CO",
+    "CONNECTICUT": "CT",
+    "DELAWARE": "DE",
+    "DISTRICT OF COLUMBIA": "DC",
+    "FLORIDA": "FL",
+    "GEORGIA": "GA",
+    "HAWAII": "HI",
+    "IDAHO": "ID",
+    "ILLINOIS": "IL",
+    "INDIANA": "IN",
+    "IOWA": "IA",
+    "KANSAS": "KS",
+    "KENTUCKY": "KY",
+    "LOUISIANA": "LA",
+    "MAINE": "ME",
+    "MARYLAND": "MD",
+    "MASSACHUSETTS": "MA",
+    "MICHIGAN": "MI",
+    "MINNESOTA": "MN",
+    "MISSISSIPPI": "MS",
+    "MISSOURI": "MO",
+    "MONTANA": "MT",
+    "NEBRASKA": "NE",
+    "NEVADA": "NV",
+    "NEW HAMPSHIRE": "NH",
+    "NEW JERSEY": "NJ",
+    "NEW MEXICO": "NM",
+    "NEW YORK": "NY",
+    "NORTH CAROLINA": "NC",
+    "NORTH DAKOTA": "ND",
+    "OHIO": "OH",
+    "OKLAHOMA": "OK",
+    "OREGON": "OR",
+    "PENNSYLVANIA": "PA",
+    "PUERTO RICO": "PR",
+    "RHODE ISLAND": "RI",
+    "SOUTH CAROLINA": "SC",
+    "SOUTH DAKOTA": "SD",
+    "TENNESSEE": "TN",
+    "TEXAS": "TX",
+    "UTAH": "UT",
+    "VERMONT": "VT",
+    "VIRGINIA": "VA",
+    "WASHINGTON": "WA",
+    "WEST VIRGINIA": "WV",
+    "WISCONSIN": "WI",
+    "WYOMING": "WY",
+}
+
+# Keep "/" for fractional house numbers and "-" for hyphenated ones (e.g. Queens)
+_PUNCTUATION = re.compile(r"[^\w\s/-]")
+
+
+def _clean(value):
+    """Uppercase a field, replacing punctuation and runs of whitespace with one space"""
+    return " ".join(_PUNCTUATION.sub(" ", str(value or "")).upper().split())
+
+
+def _abbreviate_street(words):
+    """
+    Abbreviate the suffix, directionals and unit designator of a street by position, so
+    names such as "Court Street" or "West Drive" keep their first word
+    """
+    words = list(words)
+    # Skip the house number, and never take the street name itself for a suffix
+    start = 1 if words and any(c.isdigit() for c in words[0]) else 0
+    suffix = next(
+        (
+            i
+            for i in range(len(words) - 1, start, -1)
+            if words[i] in STREET_SUFFIXES or words[i] in STREET_SUFFIXES.values()
+        ),
+        None,
+    )
+    end = len(words) if suffix is None else suffix
+
+    # A directional is only abbreviated when another word of the name follows it
+    if end - start > 1 and words[start] in DIRECTIONALS:
+        words[start] = DIRECTIONALS[words[start]]
+    if suffix is None:
+        if len(words) - start > 2 and words[-1] in DIRECTIONALS:
+            words[-1] = DIRECTIONALS[words[-1]]
+        return words
+
+    words[suffix] = STREET_SUFFIXES.get(words[suffix], words[suffix])
+    if suffix + 1 < len(words) and words[suffix + 1] in DIRECTIONALS:
+        words[suffix + 1] = DIRECTIONALS[words[suffix + 1]]
+    for i in range(suffix + 1, len(words)):
+        words[i] = UNIT_DESIGNATORS.get(words[i], words[i])
+    return words
+
+
+def normalize_address(street, city=None, state=None, zip=None):
+    """
+    Give the canonical (street, city, state, zip) form of an address.
+
+    Fields are uppercased and stripped of punctuation and extra whitespace. As in USPS
+    Publication 28, the final street suffix and leading or trailing directionals are
+    abbreviated (STREET to ST) but words of the street name are not, state names
+    become USPS codes and ZIP+4 codes are cut to five digits.
+
+    >>> normalize_address('79 Wistful Vista Street.', 'peoria', 'Illinois', '61604-1234')
+    ('79 WISTFUL VISTA ST', 'PEORIA', 'IL', '61604')
+    """
+    street = " ".join(_abbreviate_street(_clean(street).split()))
+    state = _clean(state)
+    zipcode = re.sub(r"\D", "", str(zip or ""))[:5]
+    return street, _clean(city), STATE_ABBREVIATIONS.get(state, state), zipcode
+
+
+class MemoryCache:
+    """
+    In-memory LRU cache for geocoder results.
+
+    Arguments:
+        maxsize (int): Number of results to keep. The least recently used result is
+            evicted when the cache is full.
+        ttl (float): Seconds a result stays valid after it is stored. None keeps
+            results until they are evicted.
+
+    Results are returned as stored, so they should not be modified by callers.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """Return the result stored under key, or None if it is missing or expired."""
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store a result under key, evicting the least recently used results if full."""
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        self._data[key] = expires, value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get_many(self, keys):
+        """Return a list of the results stored under keys, with None for each miss."""
+        return [self.get(key) for key in keys]
+
+    def set_many(self, items):
+        """Store an iterable of (key, result) pairs."""
+        for key, value in items:
+            self.set(key, value)
+
+    def clear(self):
+        """Remove every result and reset the hit and miss counters."""
+        self._data.clear()
+        self.hits = self.misses = 0
+
+
+class SQLiteCache:
+    """
+    Persistent cache for geocoder results, stored in a SQLite database file.
+
+    Arguments:
+        path (str): Path of the database file. It is created if it doesn't exist.
+        ttl (float): Seconds a result stays valid after it is stored. None keeps
+            results until they are deleted.
+        timeout (float): Seconds to wait while another process holds a lock on the
+            database. A read that can't get in is a miss, and a write is dropped, so a
+            busy cache never holds up the event loop for long.
+
+    The database uses write-ahead logging, so several processes (CLI runs, web
+    workers) can read and write the same file at once.
+
+    >>> acg = AsyncCensusGeocode(cache=SQLiteCache('geocode-cache.sqlite'))
+    """
+
+    # SQLite's default limit on the number of parameters in one statement is 999
+    _query_size = 900
+
+    def __init__(self, path, ttl=None, timeout=0.05):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Setting up the database waits as long as it takes
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+        )
+        self._conn.execute("PRAGMA busy_timeout={:d}".format(int(timeout * 1000)))
+
+    @staticmethod
+    def _busy(err):
+        """Whether an error is another connection holding a lock on the database"""
+        message = str(err).lower()
+        return "locked" in message or "busy" in message
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM results").fetchone()[0]
+
+    @staticmethod
+    def _dumps(value):
+        if isinstance(value, AddressResult):
+            value = {"result": {"input": value.input, "addressMatches": list(value)}}
+        elif isinstance(value, GeographyResult):
+            value = {"result": {"input": value.input, "geographies": dict(value)}}
+        return json.dumps(value, separators=(",", ":"))
+
+    @staticmethod
+    def _loads(text):
+        value = json.loads(text)
+        if "result" in value:
+            return _parse_response(value)
+        return value
+
+    def get(self, key):
+        """Return the result stored under key, or None if it is missing or expired."""
+        return self.get_many([key])[0]
+
+    def set(self, key, value):
+        """Store a result under key."""
+        self.set_many([(key, value)])
+
+    def get_many(self, keys):
+        """Return a list of the results stored under keys, with None for each miss."""
+        keys = [json.dumps(key) for key in keys]
+        found = {}
+        now = time.time()
+        with self._lock:
+            try:
+                for i in range(0, len(keys), self._query_size):
+                    part = keys[i : i + self._query_size]
+                    found.update(
+                        self._conn.execute(
+                            "SELECT key, value FROM results WHERE key IN ({}) "
+                            "AND (expires IS NULL OR expires > ?)".format(
+                                ",".join("?" * len(part))
+                            ),
+                            part + [now],
+                        )
+                    )
+            except sqlite3.OperationalError as err:
+                if not self._busy(err):
+                    raise
+                found = {}
+
+        results = [found.get(key) for key in keys]
+        self.hits += len(results) - results.count(None)
+        self.misses += results.count(None)
+        return [None if text is None else self._loads(text) for text in results]
+
+    def set_many(self, items):
+        """Store an iterable of (key, result) pairs."""
+        expires = None if self.ttl is None else time.time() + self.ttl
+        rows = [(json.dumps(key), self._dumps(value), expires) for key, value in items]
+        with self._lock:
+            # Take the write lock up front, so a busy database drops the whole write
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as err:
+                if not self._busy(err):
+                    raise
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+                    rows,
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def clear(self):
+        """Remove every result and reset the hit and miss counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+        self.hits = self.misses = 0
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+class BatchJournal:
+    """
+    Checkpoint journal of a batch job, stored in a SQLite database file.
+
+    Arguments:
+        path (str): Path of the database file. It is created if it doesn't exist.
+
+    Each chunk of the input is recorded when it is submitted, and again with its result
+    rows when it completes. Run the same job with the same journal after a crash and the
+    completed chunks are answered from the journal, so only the rest are sent. Chunks
+    are matched by position and a digest of their rows, so the input, chunksize and
+    dedupe setting must not change between runs.
+
+    >>> await acg.addressbatch('data/2m-addresses.csv', checkpoint=BatchJournal('job.sqlite'))
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks "
+            "(idx INTEGER PRIMARY KEY, digest TEXT NOT NULL, status TEXT NOT NULL, rows TEXT)"
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+
+    @staticmethod
+    def digest(*parts):
+        """Fingerprint a chunk from its rows and the settings it is sent with"""
+        text = json.dumps(parts, default=str, separators=(",", ":"))
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, index, digest):
+        """
+        Return the result rows of a completed chunk, or None if it has not completed.
+        Raises ValueError if the journal holds a different chunk at this position.
+        """
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT digest, status, rows FROM chunks WHERE idx = ?", (index,)
+            ).fetchone()
+        if found is None:
+            return None
+        if found[0] != digest:
+            raise ValueError(
+                "chunk {} of {} was journaled for a different input".format(
+                    index, self.path
+                )
+            )
+        if found[1] != "completed":
+            return None
+        return json.loads(found[2])
+
+    def submitted(self, index, digest):
+        """Record that a chunk has been sent"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks (idx, digest, status) VALUES (?, ?, 'submitted')",
+                (index, digest),
+            )
+
+    def completed(self, index, digest, rows):
+        """Record the result rows of a chunk"""
+        text = json.dumps([dict(row) for row in rows], separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks (idx, digest, status, rows) "
+                "VALUES (?, ?, 'completed', ?)",
+                (index, digest, text),
+            )
+
+    def status(self):
+        """Give the number of chunks in each status, e.g. {'completed': 3, 'submitted': 1}"""
+        with self._lock:
+            return dict(
+                self._conn.execute(
+                    "SELECT status, count(*) FROM chunks GROUP BY status"
+                )
+            )
+
+    def clear(self):
+        """Forget every chunk, to run a job from the start."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+class ReplayTransport:
+    """
+    Record responses of the Census to an archive, and replay them without the network.
+
+    Arguments:
+        path (str): Path of the archive, a SQLite database file. It is created if it
+            doesn't exist.
+        mode (str): "record" sends requests on with `transport` and stores each
+            response. "replay" answers from the archive only, and raises
+            `httpx.TransportError` for requests that were never recorded.
+        transport (httpx.AsyncBaseTransport): Transport that records send requests
+            with. Defaults to an `httpx.AsyncHTTPTransport`.
+        latency (float): Multiple of the recorded latency to wait before replaying a
+            response. 0 (the default) replays at memory speed, 1 as fast as the Census
+            answered.
+
+    Requests are keyed on their method, path and normalized parameters. Batch uploads
+    are keyed on their form fields and the normalized rows of the address file, so the
+    random multipart boundary doesn't matter. Bodies are stored compressed, in a table
+    indexed by a digest of the key.
+
+    >>> transport = ReplayTransport('census.sqlite', mode='record')
+    >>> acg = AsyncCensusGeocode(transport=transport)
+    """
+
+    modes = ("record", "replay")
+
+    def __init__(self, path, mode="replay", transport=None, latency=0.0):
+        if mode not in self.modes:
+            raise ValueError("mode must be one of {}".format(", ".join(self.modes)))
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        if transport is None and mode == "record":
+            transport = httpx.AsyncHTTPTransport()
+        self._transport = transport
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key BLOB PRIMARY KEY, "
+            "method TEXT NOT NULL, url TEXT NOT NULL, status INTEGER NOT NULL, "
+            "content_type TEXT, body BLOB NOT NULL, elapsed REAL NOT NULL) WITHOUT ROWID"
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def _normalize_param(value):
+        """Normalized query parameter. Numbers compare by value, so -74 matches -74.0."""
+        try:
+            return _normalize(float(value))
+        except ValueError:
+            return _normalize(value)
+
+    @staticmethod
+    def _normalize_file(content):
+        """Normalized rows of an uploaded address file"""
+        text = content.decode("utf-8", errors="replace")
+        return [
+            [_normalize(value) for value in row]
+            for row in csv.reader(io.StringIO(text))
+        ]
+
+    def key(self, request):
+        """Digest of the normalized method, path, parameters and form fields of request"""
+        url = request.url
+        parts = [request.method, url.host, url.path]
+        parts.append(
+            sorted(
+                (name, self._normalize_param(value))
+                for name, value in url.params.multi_items()
+            )
+        )
+
+        content_type = request.headers.get("Content-Type", "")
+        if "boundary=" in content_type:
+            boundary = (
+                content_type.split("boundary=", 1)[1].strip('"').encode("latin-1")
+            )
+            fields = []
+            for part in request.content.split(b"--" + boundary)[1:-1]:
+                head, _, content = part.partition(b"\r\n\r\n")
+                name = re.search(rb'name="([^"]*)"', head)
+                content = content[: -len(b"\r\n")]
+                if b"filename=" in head:
+                    fields.append(
+                        (name.group(1).decode(), self._normalize_file(content))
+                    )
+                else:
+                    fields.append(
+                        (name.group(1).decode(), _normalize(content.decode()))
+                    )
+            parts.append(sorted(fields))
+        elif request.content:
+            parts.append(hashlib.sha256(request.content).hexdigest())
+
+        text = json.dumps(parts, separators=(",", ":"))
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        key = self.key(request)
+        if self.mode == "record":
+            return await self._record(key, request)
+
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT status, content_type, body, elapsed FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if found is None:
+            raise httpx.TransportError(
+                "No recorded response for {} {} in {}".format(
+                    request.method, request.url, self.path
+                ),
+                request=request,
+            )
+        status, content_type, body, elapsed = found
+        if self.latency:
+            await asyncio.sleep(elapsed * self.latency)
+        return self._response(status, content_type, zlib.decompress(body))
+
+    async def _record(self, key, request):
+        started = time.perf_counter()
+        r = await self._transport.handle_async_request(request)
+        try:
+            content = await r.aread()
+        finally:
+            await r.aclose()
+        elapsed = time.perf_counter() - started
+
+        content_type = r.headers.get("Content-Type")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, method, url, status, content_type, body, elapsed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    request.method,
+                    str(request.url),
+                    r.status_code,
+                    content_type,
+                    zlib.compress(content),
+                    elapsed,
+                ),
+            )
+        return self._response(r.status_code, content_type, content)
+
+    @staticmethod
+    def _response(status, content_type, content):
+        headers = {} if content_type is None else {"Content-Type": content_type}
+        return httpx.Response(status, headers=headers, content=content)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close the transport records are sent with. The archive stays open."""
+        if self._transport is not None:
+            await self._transport.aclose()
+
+    def close(self):
+        """Close the archive."""
+        with self._lock:
+            self._conn.close()
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for requests to the Census that adapts to how the service copes.
+
+    The limit grows by about one request per round trip while requests succeed within
+    `tolerance` times the fastest recent latency for their search type. It holds while
+    latency is above that, and is multiplied by `backoff` on timeouts, connection
+    errors, 5xx and 429 responses (additive increase, multiplicative decrease).
+
+    Arguments:
+        initial (int): Requests allowed in flight at the start.
+        max_limit (int): Hard cap on requests in flight.
+        min_limit (int): The limit never drops below this.
+        rate (float): Ceiling on requests started per second. None for no ceiling.
+        backoff (float): Factor the limit is multiplied by after an error.
+        tolerance (float): Latency, as a multiple of the baseline, above which the
+            limit stops growing.
+
+    >>> acg = AsyncCensusGeocode(limiter=AdaptiveLimiter(max_limit=32, rate=50))
+    """
+
+    def __init__(
+        self,
+        initial=4,
+        max_limit=64,
+        min_limit=1,
+        rate=None,
+        backoff=0.5,
+        tolerance=2.0,
+    ):
+        if not 0 < min_limit <= initial <= max_limit:
+            raise ValueError("need 0 < min_limit <= initial <= max_limit")
+        self.limit = float(initial)
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.rate = rate
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.inflight = 0
+        self._baseline = {}
+        self._decreased = float("-inf")
+        self._next_start = float("-inf")
+        self._waiters = deque()
+
+    def _wake(self):
+        for _ in range(int(self.limit) - self.inflight):
+            while self._waiters and self._waiters[0].done():
+                self._waiters.popleft()
+            if not self._waiters:
+                return
+            self._waiters.popleft().set_result(None)
+
+    async def acquire(self):
+        """Wait for a free slot (and the rate ceiling), returning the start time."""
+        while self.inflight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+        self.inflight += 1
+
+        if self.rate:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + 1 / self.rate
+            if start > now:
+                try:
+                    await asyncio.sleep(start - now)
+                except asyncio.CancelledError:
+                    self.release(None, None, None)
+                    raise
+
+        return time.monotonic()
+
+    def release(self, started, key, ok, latency=None):
+        """
+        Free the slot of a request that began at `started`. `ok` is True for success,
+        False for an overload error and None when the request was abandoned. `latency`
+        is the time the Census took, if less than the time the slot was held.
+        """
+        self.inflight -= 1
+        now = time.monotonic()
+
+        if ok is False:
+            # Only the first error of a congestion episode cuts the limit
+            if started is not None and started > self._decreased:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._decreased = now
+
+        elif ok:
+            if latency is None:
+                latency = now - started
+            baseline = self._baseline.get(key, latency)
+            # Let the baseline creep up, so it follows lasting changes in latency
+            self._baseline[key] = min(latency, baseline + (latency - baseline) * 0.01)
+            if latency <= baseline * self.tolerance:
+                self.limit = min(self.max_limit, self.limit + 1 / int(self.limit))
+
+        self._wake()
+
+
+class RetryPolicy:
+    """
+    When to retry a failed request to the Census, and how long to wait first.
+
+    Arguments:
+        attempts (int): Tries per request, including the first.
+        backoff (float): Seconds to wait before the first retry. The wait doubles for
+            each later retry.
+        max_backoff (float): Cap on the wait between tries.
+        jitter (bool): Wait a random time between zero and the backoff, so clients
+            that failed together do not retry together.
+        statuses (tuple): Response status codes worth retrying.
+        exceptions (tuple): Exception classes worth retrying. Defaults to httpx's
+            timeouts, network errors and protocol errors.
+        budget (int): Retries allowed in total, across every request that uses the
+            policy. None for no limit.
+
+    >>> acg = AsyncCensusGeocode(retry=RetryPolicy(attempts=5, budget=100))
+    """
+
+    def __init__(
+        self,
+        attempts=3,
+        backoff=0.5,
+        max_backoff=30.0,
+        jitter=True,
+        statuses=(429, 500, 502, 503, 504),
+        exceptions=None,
+        budget=None,
+    ):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = statuses
+        if exceptions is None:
+            exceptions = (
+                httpx.TimeoutException,
+                httpx.NetworkError,
+                httpx.RemoteProtocolError,
+            )
+        self.exceptions = exceptions
+        self.budget = budget
+        self.retries = 0
+
+    def retryable(self, err):
+        """Whether a request that failed with err is worth retrying."""
+        if isinstance(err, httpx.HTTPStatusError):
+            return err.response.status_code in self.statuses
+        return isinstance(err, self.exceptions)
+
+    def should_retry(self, attempt, err=None):
+        """
+        Whether to try again after `attempt` tries, the last failing with err. An err of
+        None stands for an incomplete result, e.g. rows missing from a batch response.
+        """
+        if attempt >= self.attempts:
+            return False
+        if err is not None and not self.retryable(err):
+            return False
+        return self.budget is None or self.retries < self.budget
+
+    def delay(self, attempt):
+        """Seconds to wait after `attempt` failed tries."""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    async def sleep(self, attempt):
+        """Wait before the next try, counting it against the budget."""
+        self.retries += 1
+        await asyncio.sleep(self.delay(attempt))
+
+
+class MicroBatch:
+    """
+    Send concurrent `address()` lookups together, as one `addressbatch` upload.
+
+    Arguments:
+        window (float): Seconds the first queued lookup waits for others before the
+            batch is sent. This bounds the latency micro-batching adds to a lookup.
+        max_rows (int): Send the batch as soon as this many lookups are queued, at most
+            10,000.
+        min_rows (int): When the window closes with fewer lookups queued than this,
+            they are sent as single requests, so light traffic doesn't wait on batch
+            uploads.
+
+    >>> acg = AsyncCensusGeocode(microbatch=MicroBatch(window=0.05, max_rows=500))
+    """
+
+    def __init__(self, window=0.05, max_rows=1000, min_rows=2):
+        if window < 0:
+            raise ValueError("window must not be negative")
+        if not 0 < min_rows <= max_rows <= BATCH_LIMIT:
+            raise ValueError("need 0 < min_rows <= max_rows <= {}".format(BATCH_LIMIT))
+        self.window = window
+        self.max_rows = max_rows
+        self.min_rows = min_rows
+
+
+class MetricsCollector:
+    """
+    In-memory metrics for the requests of an `AsyncCensusGeocode`: throughput counters
+    and latency histograms of network and parse time, by searchtype.
+
+    Pass it as a hook, then read `snapshot()`, or `counters`, `percentile()` and `rate()`:
+
+    >>> metrics = MetricsCollector()
+    >>> acg = AsyncCensusGeocode(hooks=[metrics])
+    >>> metrics.percentile('network', 'addressbatch', 0.99)
+    """
+
+    # Upper bounds of the latency histogram buckets, in seconds
+    buckets = (
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+        30.0,
+        60.0,
+        120.0,
+        300.0,
+        math.inf,
+    )
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Zero every counter and histogram."""
+        self.started = time.monotonic()
+        self.counters = Counter()
+        self.histograms = {}
+        self.sums = Counter()
+
+    def __call__(self, event, fields):
+        handler = getattr(self, "_on_" + event, None)
+        if handler is not None:
+            handler(fields)
+
+    def _observe(self, name, searchtype, seconds):
+        key = (name, searchtype)
+        histogram = self.histograms.setdefault(key, [0] * len(self.buckets))
+        histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sums[key] += seconds
+
+    def _on_request_end(self, fields):
+        self.counters["requests"] += 1
+        self.counters["bytes_sent"] += fields["bytes_sent"]
+        self.counters["bytes_received"] += fields["bytes_received"]
+        if fields["error"] is not None:
+            self.counters["errors"] += 1
+        self._observe("network", fields["searchtype"], fields["elapsed"])
+
+    def _on_retry(self, fields):
+        self.counters["retries"] += 1
+
+    def _on_parse(self, fields):
+        self._observe("parse", fields["searchtype"], fields["elapsed"])
+
+    def _on_batch(self, fields):
+        for name in ("rows_sent", "rows_received", "matched", "unmatched", "tied"):
+            self.counters[name] += fields[name]
+
+    def _on_cache(self, fields):
+        self.counters["cache_hits"] += fields["hits"]
+        self.counters["cache_misses"] += fields["misses"]
+
+    def _on_coalesce(self, fields):
+        self.counters["coalesced"] += 1
+
+    def percentile(self, name, searchtype, q):
+        """
+        Upper bound of the histogram bucket holding the q quantile (0 to 1) of the
+        'network' or 'parse' latency of a searchtype, or None before any request
+        """
+        histogram = self.histograms.get((name, searchtype))
+        if not histogram:
+            return None
+        rank = q * sum(histogram)
+        seen = 0
+        for bound, count in zip(self.buckets, histogram):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def rate(self, counter):
+        """Give a counter per second since the collector started or was reset."""
+        elapsed = time.monotonic() - self.started
+        return self.counters[counter] / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        """Give the counters, and count, mean, p50, p90 and p99 of each latency"""
+        latency = {}
+        for (name, searchtype), histogram in self.histograms.items():
+            count = sum(histogram)
+            latency.setdefault(name, {})[searchtype] = {
+                "count": count,
+                "mean": self.sums[name, searchtype] / count,
+                "p50": self.percentile(name, searchtype, 0.5),
+                "p90": self.percentile(name, searchtype, 0.9),
+                "p99": self.percentile(name, searchtype, 0.99),
+            }
+        return {
+            "elapsed": time.monotonic() - self.started,
+            "counters": dict(self.counters),
+            "latency": latency,
+        }
+
+
+class OpenTelemetryHook:
+    """
+    Report the requests of an `AsyncCensusGeocode` as OpenTelemetry metrics. Requires
+    opentelemetry-api, and an SDK with an exporter configured to send them anywhere.
+
+    Arguments:
+        meter (opentelemetry.metrics.Meter): Meter to create instruments with. Defaults
+            to the global meter provider's meter for this package.
+
+    >>> acg = AsyncCensusGeocode(hooks=[OpenTelemetryHook()])
+    """
+
+    def __init__(self, meter=None):
+        try:
+            from opentelemetry import metrics
+        except ImportError as err:
+            raise ImportError(
+                "OpenTelemetryHook requires opentelemetry-api: pip install opentelemetry-api"
+            ) from err
+
+        meter = meter or metrics.get_meter("async_censusgeocode")
+        self._network = meter.create_histogram(
+            "census.request.duration", unit="s", description="Census request time"
+        )
+        self._parse = meter.create_histogram(
+            "census.parse.duration", unit="s", description="Census response parse time"
+        )
+        self._requests = meter.create_counter(
+            "census.requests", description="Requests sent to the Census"
+        )
+        self._retries = meter.create_counter(
+            "census.retries", description="Requests retried"
+        )
+        self._bytes = meter.create_counter(
+            "census.bytes", unit="By", description="Bytes sent and received"
+        )
+        self._rows = meter.create_counter(
+            "census.batch.rows", description="Batch rows by match status"
+        )
+        self._cache = meter.create_counter(
+            "census.cache.lookups", description="Cache lookups by result"
+        )
+        self._coalesced = meter.create_counter(
+            "census.coalesced",
+            description="Lookups answered by another caller's in-flight request",
+        )
+
+    def __call__(self, event, fields):
+        if event == "request_end":
+            attributes = {
+                "searchtype": fields["searchtype"],
+                "status": fields["status"] or 0,
+                "error": type(fields["error"]).__name__ if fields["error"] else "",
+            }
+            self._requests.add(1, attributes)
+            self._network.record(fields["elapsed"], attributes)
+            self._bytes.add(fields["bytes_sent"], {"direction": "sent"})
+            self._bytes.add(fields["bytes_received"], {"direction": "received"})
+        elif event == "parse":
+            self._parse.record(fields["elapsed"], {"searchtype": fields["searchtype"]})
+        elif event == "retry":
+            self._retries.add(1, {"searchtype": fields["searchtype"]})
+        elif event == "batch":
+            for status in ("matched", "unmatched", "tied"):
+                self._rows.add(fields[status], {"status": status})
+        elif event == "cache":
+            attributes = {"searchtype": fields["searchtype"]}
+            self._cache.add(fields["hits"], dict(attributes, result="hit"))
+            self._cache.add(fields["misses"], dict(attributes, result="miss"))
+        elif event == "coalesce":
+            self._coalesced.add(1, {"searchtype": fields["searchtype"]})
+
+
+@functools.lru_cache(maxsize=None)
+def _default_decoder():
+    """The fastest JSON decoder installed: orjson, then msgspec, then the json module"""
+    try:
+        import orjson
+
+        return orjson.loads
+    except ImportError:
+        pass
+    try:
+        import msgspec
+
+        return msgspec.json.decode
+    except ImportError:
+        return json.loads
+
+
+def schema_decoder(layers=None, attributes=None, match_fields=None):
+    """
+    Build a JSON decoder with msgspec that decodes only the parts of a response asked for.
+    Everything else is skipped while decoding rather than built and thrown away.
+
+    Arguments:
+        layers (list): Geography layers to decode, e.g. `['Census Tracts']`.
+        attributes (list): Attributes to decode for each geography, e.g.
+            `['GEOID', 'TRACT']`. CENTLON, CENTLAT, INTPTLON and INTPTLAT are always kept.
+        match_fields (list): Fields to decode for each address match, e.g.
+            `['matchedAddress', 'coordinates']`. Geographies of matches are always kept.
+
+    >>> AsyncCensusGeocode(decoder=schema_decoder(layers=['Census Tracts'], attributes=['GEOID']))
+    """
+    try:
+        import msgspec
+    except ImportError as err:
+        raise ImportError(
+            "schema_decoder requires msgspec: pip install msgspec"
+        ) from err
+
+    from typing import Any, Dict, List, TypedDict
+
+    geography = Dict[str, Any]
+    if attributes is not None:
+        names = set(attributes) | {"CENTLON", "CENTLAT", "INTPTLON", "INTPTLAT"}
+        geography = TypedDict("Geography", {name: Any for name in names}, total=False)
+
+    geographies = Dict[str, List[geography]]
+    if layers is not None:
+        geographies = TypedDict(
+            "Geographies", {name: List[geography] for name in layers}, total=False
+        )
+
+    match = Dict[str, Any]
+    if match_fields is not None:
+        fields = {name: Any for name in match_fields}
+        fields["geographies"] = geographies
+        match = TypedDict("AddressMatch", fields, total=False)
+
+    result = TypedDict(
+        "Result",
+        {"input": Any, "addressMatches": List[match], "geographies": geographies},
+        total=False,
+    )
+    response = TypedDict("Response", {"result": result}, total=False)
+    return msgspec.json.Decoder(response).decode
+
+
+def _parse_response(content, layers=None):
+    """
+    Wrap a decoded response from the Geocoding API in its result type, keeping only
+    the named geography layers if layers is given
+    """
+    if "addressMatches" in content.get("result", {}):
+        return AddressResult(content)
+
+    if "geographies" in content.get("result", {}):
+        return GeographyResult(content, layers)
+
+    raise ValueError()
+
+
+# TIGER/Line attribute names that differ from the Geocoding API's
+TIGER_FIELDS = {
+    "STATEFP": "STATE",
+    "COUNTYFP": "COUNTY",
+    "COUSUBFP": "COUSUB",
+    "PLACEFP": "PLACE",
+    "TRACTCE": "TRACT",
+    "BLKGRPCE": "BLKGRP",
+    "BLOCKCE": "BLOCK",
+}
+
+
+def _geography_attributes(properties):
+    """Rename TIGER/Line attributes (e.g. STATEFP20) to the API's names (STATE)"""
+    attributes = {}
+    for key, value in properties.items():
+        name = re.sub(r"\d\d$", "", key.upper())
+        attributes[TIGER_FIELDS.get(name, name)] = value
+    return attributes
+
+
+def _ring_contains(ring, x, y):
+    """Even-odd ray casting: whether a horizontal ray from (x, y) crosses the ring an odd
+    number of times"""
+    inside = False
+    xj, yj = ring[-1]
+    for xi, yi in ring:
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        xj, yj = xi, yi
+    return inside
+
+
+def _centroid(rings):
+    """Area-weighted centroid of a polygon given as rings, holes included"""
+    area = cx = cy = 0.0
+    for ring in rings:
+        xj, yj = ring[-1]
+        for xi, yi in ring:
+            cross = xj * yi - xi * yj
+            area += cross
+            cx += (xj + xi) * cross
+            cy += (yj + yi) * cross
+            xj, yj = xi, yi
+    if area == 0:
+        xs = [x for ring in rings for x, _ in ring]
+        ys = [y for ring in rings for _, y in ring]
+        return (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+    return cx / (3 * area), cy / (3 * area)
+
+
+class _BoundaryLayer:
+    """Polygons of one layer, indexed by a uniform grid of their bounding boxes"""
+
+    def __init__(self, features):
+        # features are (rings, attributes) pairs
+        self.rings = []
+        self.attributes = []
+        self.bboxes = []
+        for rings, attributes in features:
+            xs = [x for ring in rings for x, _ in ring]
+            ys = [y for ring in rings for _, y in ring]
+            self.rings.append(rings)
+            self.attributes.append(attributes)
+            self.bboxes.append((min(xs), min(ys), max(xs), max(ys)))
+
+        if not self.bboxes:
+            raise ValueError("no polygons to index")
+
+        self.xmin = min(b[0] for b in self.bboxes)
+        self.ymin = min(b[1] for b in self.bboxes)
+        xmax = max(b[2] for b in self.bboxes)
+        ymax = max(b[3] for b in self.bboxes)
+        # About one polygon per cell
+        side = max(1, int(math.sqrt(len(self.bboxes))))
+        self.cellwidth = (xmax - self.xmin) / side or 1.0
+        self.cellheight = (ymax - self.ymin) / side or 1.0
+        self.side = side
+
+        self.cells = {}
+        for n, (x0, y0, x1, y1) in enumerate(self.bboxes):
+            i0, j0 = self._cell(x0, y0)
+            i1, j1 = self._cell(x1, y1)
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    self.cells.setdefault((i, j), []).append(n)
+
+    def _cell(self, x, y):
+        i = int((x - self.xmin) / self.cellwidth)
+        j = int((y - self.ymin) / self.cellheight)
+        return min(max(i, 0), self.side - 1), min(max(j, 0), self.side - 1)
+
+    def _candidates(self, x, y):
+        for n in self.cells.get(self._cell(x, y), ()):
+            x0, y0, x1, y1 = self.bboxes[n]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                yield n
+
+    def find(self, x, y):
+        """Index of the polygon containing (x, y), or None."""
+        for n in self._candidates(x, y):
+            inside = False
+            for ring in self.rings[n]:
+                inside ^= _ring_contains(ring, x, y)
+            if inside:
+                return n
+        return None
+
+    def find_many(self, np, xs, ys):
+        """Indexes of the polygons containing each point, -1 where there is none."""
+        found = np.full(len(xs), -1)
+        cells = {}
+        for k, (x, y) in enumerate(zip(xs.tolist(), ys.tolist())):
+            cells.setdefault(self._cell(x, y), []).append(k)
+
+        for cell, points in cells.items():
+            points = np.asarray(points)
+            for n in self.cells.get(cell, ()):
+                points = points[found[points] < 0]
+                if not len(points):
+                    break
+                px, py = xs[points], ys[points]
+                x0, y0, x1, y1 = self.bboxes[n]
+                inbox = (px >= x0) & (px <= x1) & (py >= y0) & (py <= y1)
+                if not inbox.any():
+                    continue
+
+                # Ray casting, vectorized over the points and looping over the edges
+                px, py = px[inbox], py[inbox]
+                inside = np.zeros(len(px), dtype=bool)
+                for ring in self.rings[n]:
+                    ring = np.asarray(ring, dtype=float)
+                    xi, yi = ring[:, 0], ring[:, 1]
+                    xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        for e in range(len(ring)):
+                            crosses = (yi[e] > py) != (yj[e] > py)
+                            xcross = (xj[e] - xi[e]) * (py - yi[e]) / (
+                                yj[e] - yi[e]
+                            ) + xi[e]
+                            inside ^= crosses & (px < xcross)
+                found[points[inbox][inside]] = n
+        return found
+
+
+class BoundaryIndex:
+    """
+    Local reverse geocoder for `coordinates()` backed by boundary files.
+
+    Load TIGER/Line shapefiles (requires `pyshp`) or GeoJSON files for the layers you
+    need under the layer names the Geocoding API uses. Points are then looked up in a
+    grid index of the polygons, without a request to the Census.
+
+    >>> index = BoundaryIndex()
+    >>> index.load('Census Tracts', 'tl_2020_11_tract.zip')
+    >>> index.load('2020 Census Blocks', 'tl_2020_11_tabblock20.zip')
+    >>> acg = AsyncCensusGeocode(boundaries=index)
+    >>> await acg.coordinates(-77.0365, 38.8977)
+
+    Results have the shape of the API's: GEOID, STATE, COUNTY, TRACT, BLOCK and the
+    other attributes of the file, with CENT and INTPT tuples. Only the loaded layers are
+    returned. Points outside the loaded boundaries are sent to the Census.
+    """
+
+    def __init__(self):
+        self._layers = {}
+
+    @property
+    def layers(self):
+        """Names of the loaded layers."""
+        return list(self._layers)
+
+    def load(self, layer, path):
+        """Load the boundaries of a layer from a shapefile (.shp or .zip) or GeoJSON file."""
+        if str(path).lower().endswith((".json", ".geojson")):
+            features = self._read_geojson(path)
+        else:
+            features = self._read_shapefile(path)
+        self._layers[layer] = _BoundaryLayer(features)
+
+    @staticmethod
+    def _read_geojson(path):
+        with open(path, encoding="utf-8") as f:
+            collection = json.load(f)
+
+        for feature in collection["features"]:
+            geometry = feature["geometry"]
+            if geometry["type"] == "Polygon":
+                polygons = [geometry["coordinates"]]
+            elif geometry["type"] == "MultiPolygon":
+                polygons = geometry["coordinates"]
+            else:
+                continue
+            rings = [[tuple(p[:2]) for p in ring] for poly in polygons for ring in poly]
+            yield rings, feature.get("properties") or {}
+
+    @staticmethod
+    def _read_shapefile(path):
+        try:
+            import shapefile
+        except ImportError as err:
+            raise ImportError(
+                "Reading shapefiles requires pyshp: pip install pyshp"
+            ) from err
+
+        with shapefile.Reader(path) as reader:
+            for shaperecord in reader.iterShapeRecords():
+                shape = shaperecord.shape
+                parts = list(shape.parts) + [len(shape.points)]
+                rings = [
+                    [tuple(p) for p in shape.points[start:end]]
+                    for start, end in zip(parts, parts[1:])
+                ]
+                yield rings, shaperecord.record.as_dict()
+
+    def _geography(self, layer, n):
+        attributes = _geography_attributes(self._layers[layer].attributes[n])
+        if "CENTLON" not in attributes:
+            lon, lat = _centroid(self._layers[layer].rings[n])
+            attributes["CENTLON"] = "{:+.7f}".format(lon)
+            attributes["CENTLAT"] = "{:+.7f}".format(lat)
+        attributes.setdefault("INTPTLON", attributes["CENTLON"])
+        attributes.setdefault("INTPTLAT", attributes["CENTLAT"])
+        return attributes
+
+    def _result(self, x, y, geographies):
+        return GeographyResult(
+            {
+                "result": {
+                    "input": {"location": {"x": x, "y": y}},
+                    "geographies": geographies,
+                }
+            }
+        )
+
+    def _requested(self, layers):
+        """Loaded layers to answer with, or None if some requested layer isn't loaded"""
+        if layers is None:
+            return list(self._layers)
+        requested = [name.strip() for name in str(layers).split(",")]
+        if all(name in self._layers for name in requested):
+            return requested
+        return None
+
+    def coordinates(self, x, y, layers=None):
+        """
+        Look up a (lon, lat) point. Returns a GeographyResult, or None if the point is
+        outside the boundaries of a layer or `layers` names a layer that isn't loaded.
+        """
+        requested = self._requested(layers)
+        if not requested:
+            return None
+
+        geographies = {}
+        for layer in requested:
+            n = self._layers[layer].find(float(x), float(y))
+            if n is None:
+                return None
+            geographies[layer] = [self._geography(layer, n)]
+        return self._result(x, y, geographies)
+
+    def coordinates_many(self, xs, ys, layers=None):
+        """
+        Look up arrays of longitudes and latitudes at once. Returns a list with a
+        GeographyResult, or None, for each point. Uses numpy when it is installed.
+        """
+        requested = self._requested(layers)
+        if not requested:
+            return [None] * len(xs)
+
+        try:
+            import numpy as np
+        except ImportError:
+            return [self.coordinates(x, y, layers) for x, y in zip(xs, ys)]
+
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        found = {
+            layer: self._layers[layer].find_many(np, xs, ys) for layer in requested
+        }
+
+        results = []
+        for k in range(len(xs)):
+            ns = [found[layer][k] for layer in requested]
+            if min(ns) < 0:
+                results.append(None)
+                continue
+            geographies = {
+                layer: [self._geography(layer, int(n))]
+                for layer, n in zip(requested, ns)
+            }
+            results.append(self._result(float(xs[k]), float(ys[k]), geographies))
+        return results
+
+
+class _BatchUpload(io.RawIOBase):
+    """
+    Binary file that encodes batch rows to CSV as it is read, so an upload never holds
+    more than a block of the CSV in memory. It can be rewound for retries, and seeking
+    to the end measures it (without keeping the bytes) so httpx can send a
+    Content-Length.
+    """
+
+    # Rows encoded at a time
+    _block = 512
+
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+        self._length = None
+        self._rewind()
+
+    def _rewind(self):
+        self._next = 0
+        self._position = 0
+        self._buffer = memoryview(b"")
+
+    def _encode(self, start):
+        text = io.StringIO()
+        csv.writer(text).writerows(self.rows[start : start + self._block])
+        return text.getvalue().encode("utf-8")
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END and offset == 0:
+            if self._length is None:
+                self._length = sum(
+                    len(self._encode(i)) for i in range(0, len(self.rows), self._block)
+                )
+            self._next, self._buffer = len(self.rows), memoryview(b"")
+            self._position = self._length
+        elif whence == io.SEEK_SET and offset == 0:
+            self._rewind()
+        elif not (whence == io.SEEK_SET and offset == self._position):
+            raise io.UnsupportedOperation("can only seek to the start or the end")
+        return self._position
+
+    def readinto(self, b):
+        while not self._buffer and self._next < len(self.rows):
+            self._buffer = memoryview(self._encode(self._next))
+            self._next += self._block
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self._position += n
+        return n
+
+
+class _Chunker:
+    """
+    Collects batch rows into chunks of up to chunksize rows or, with dedupe, of up to
+    chunksize distinct normalized addresses, however many rows share them.
+    """
+
+    def __init__(self, chunksize, dedupe):
+        if not 0 < chunksize <= BATCH_LIMIT:
+            raise ValueError(
+                "chunksize must be between 1 and {}, got {}".format(
+                    BATCH_LIMIT, chunksize
+                )
+            )
+        self.chunksize = chunksize
+        self.dedupe = dedupe
+        self.chunk, self.addresses = [], set()
+
+    def add(self, row):
+        """Add a row. Returns a chunk once one is complete, else None."""
+        if not self.dedupe:
+            self.chunk.append(row)
+            if len(self.chunk) == self.chunksize:
+                return self.flush()
+            return None
+
+        # A chunk is only complete when a new address does not fit in it. The normalized
+        # address is only the key, the rows uploaded are the caller's own
+        address = normalize_address(*row[1:5])
+        chunk = None
+        if address not in self.addresses and len(self.addresses) == self.chunksize:
+            chunk = self.flush()
+        self.addresses.add(address)
+        self.chunk.append(row)
+        return chunk
+
+    def flush(self):
+        """Give the rows collected so far, or None if there are none"""
+        chunk, self.chunk, self.addresses = self.chunk, [], set()
+        return chunk or None
 
 
 class AsyncCensusGeocode:
@@ -38,6 +1594,8 @@ class AsyncCensusGeocode:
     _url = "https://geocoding.geo.census.gov/geocoder/{returntype}/{searchtype}"
     returntypes = ["geographies", "locations"]
 
+    batchinput = ["id", "street", "city", "state", "zip"]
+
     batchfields = {
         "locations": [
             "id",
@@ -65,19 +1623,228 @@ class AsyncCensusGeocode:
         ],
     }
 
-    def __init__(self, benchmark=None, vintage=None):
+    def __init__(
+        self,
+        benchmark=None,
+        vintage=None,
+        client=None,
+        limits=None,
+        http2=False,
+        transport=None,
+        timeout=None,
+        cache=None,
+        limiter=None,
+        retry=None,
+        boundaries=None,
+        layers=None,
+        decoder=None,
+        hooks=None,
+        coalesce=True,
+        microbatch=None,
+    ):
         """
         Arguments:
             benchmark (str): A name that references the version of the locator to use.
                 See https://geocoding.geo.census.gov/geocoder/benchmarks
             vintage (str): The geography part of the desired vintage.
                 See: https://geocoding.geo.census.gov/geocoder/vintages?form
+            client (httpx.AsyncClient): An existing client to send requests with. The
+                caller keeps ownership of it, so `aclose()` leaves it open.
+            limits (httpx.Limits): Connection pool limits (max connections, keep-alive
+                connections and keep-alive expiry) for the client this class creates.
+            http2 (bool): Negotiate HTTP/2 with the Census. Requires `httpx[http2]`.
+            transport (httpx.AsyncBaseTransport): Transport for the created client,
+                e.g. for retries on connect or `httpx.MockTransport` in tests.
+            timeout (float): Default request timeout in seconds. None (the default)
+                waits indefinitely, since large batches can take minutes.
+            cache: A result cache such as `MemoryCache` or `SQLiteCache`. Lookups by
+                `address`, `onelineaddress` and `coordinates`, and `addressbatch` rows,
+                are answered from it when possible. Any object with `get`, `set`,
+                `get_many` and `set_many` methods can be used.
+            limiter (AdaptiveLimiter): Governs how many requests, single and batch, are
+                sent to the Census at once and how fast they start.
+            retry (RetryPolicy): Retries failed requests with backoff. Batch chunks are
+                retried on their own, and rows missing from a batch response are resent.
+            boundaries (BoundaryIndex): Local boundaries that answer `coordinates()` for
+                the points they cover, without a request.
+            layers (list): Names of the geography layers to keep, e.g.
+                `['Census Tracts', '2020 Census Blocks']`. Other layers are dropped from
+                geographies results as soon as they are parsed.
+            decoder (callable): Decodes the bytes of a JSON response. Defaults to
+                orjson or msgspec when installed, else the json module. See
+                `schema_decoder` for a decoder that skips the fields you don't need.
+            hooks (list): Callables called with an event name and a dict of fields as
+                requests are made, such as `MetricsCollector` or `OpenTelemetryHook`.
+                Events are request_start, request_end, retry, parse, batch, cache and
+                coalesce.
+            coalesce (bool): Share one request between concurrent `address`,
+                `onelineaddress` and `coordinates` lookups with the same normalized
+                fields. Every caller gets its result, or its exception. Results are
+                shared, so they should not be modified. Defaults to True.
+            microbatch (MicroBatch): Queue concurrent `address()` lookups for a short
+                window and send them as one batch upload. Results are built from the
+                batch rows, so matches carry matchedAddress, coordinates and tigerLine,
+                plus the block's codes under `geographies['2020 Census Blocks']` for
+                geographies lookups. Addresses the batch reports as a Tie are looked
+                up on their own, for their candidate matches.
 
         >>> CensusGeocode(benchmark='Public_AR_Current', vintage='Current_Current')
+
+        The connection pool is created on first use and reused by every request. Close
+        it with `aclose()`, or use the class as an async context manager:
+
+        >>> async with AsyncCensusGeocode() as acg:
+        ...     await acg.onelineaddress('4600 Silver Hill Rd, Suitland, MD 20746')
         """
         self._benchmark = benchmark or DEFAULT_BENCHMARK
         self._vintage = vintage or DEFAULT_VINTAGE
 
+        self._client = client
+        self._owns_client = client is None
+        self._client_loop = None
+        self._client_kwargs = {"http2": http2, "timeout": timeout}
+        if limits is not None:
+            self._client_kwargs["limits"] = limits
+        if transport is not None:
+            self._client_kwargs["transport"] = transport
+
+        self._cache = cache
+        self._limiter = limiter
+        self._retry = retry
+        self._boundaries = boundaries
+        self._layers = None if layers is None else frozenset(layers)
+        self._decoder = decoder
+        self._hooks = list(hooks or ())
+        self._coalesce = coalesce
+        self._inflight = {}
+        self._microbatch = microbatch
+        self._queued = {}
+        self._flush_timers = {}
+        self._flushing = set()
+
+    async def __aenter__(self):
+        self._get_client()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _get_client(self):
+        """Return the shared AsyncClient, creating it on first use.
+
+        Pooled connections belong to the event loop that opened them, so a client
+        created by this class is replaced when it is used from a different loop, e.g.
+        by the module-level instance across several `asyncio.run()` calls.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or (
+            self._owns_client and self._client_loop is not loop
+        ):
+            self._client = httpx.AsyncClient(**self._client_kwargs)
+            self._client_loop = loop
+        return self._client
+
+    @contextlib.asynccontextmanager
+    async def _limit(self, searchtype):
+        """
+        Hold a slot of the limiter, if any, for one request to the Census. Gives a dict
+        in which the request may set the "latency" of the Census, when it holds the slot
+        for longer than that.
+        """
+        slot = {"latency": None}
+        if self._limiter is None:
+            yield slot
+            return
+
+        started = await self._limiter.acquire()
+        try:
+            yield slot
+        except httpx.HTTPError:
+            self._limiter.release(started, searchtype, False)
+            raise
+        except BaseException:
+            self._limiter.release(started, searchtype, None)
+            raise
+        self._limiter.release(started, searchtype, True, slot["latency"])
+
+    def _raise_for_status(self, r):
+        """Raise HTTPStatusError when the Census is failing, asking us to slow down, or
+        answers with a status the retry policy retries"""
+        if (
+            r.status_code >= 500
+            or r.status_code == 429
+            or (self._retry is not None and r.status_code in self._retry.statuses)
+        ):
+            r.raise_for_status()
+
+    def _emit(self, event, **fields):
+        """Call the hooks with an event. A hook that fails is logged, not raised."""
+        for hook in self._hooks:
+            try:
+                hook(event, fields)
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    "hook %r failed on %s event", hook, event
+                )
+
+    def _request_end(self, searchtype, attempt, started, r, error=None, elapsed=None):
+        """Emit request_end for a response (None if there was none) or a failure"""
+        if not self._hooks:
+            return
+
+        received = 0
+        if r is not None:
+            # Responses built in memory (e.g. by MockTransport) download nothing
+            received = r.num_bytes_downloaded
+            try:
+                received = received or len(r.content)
+            except httpx.ResponseNotRead:
+                pass
+
+        self._emit(
+            "request_end",
+            searchtype=searchtype,
+            attempt=attempt,
+            status=None if r is None else r.status_code,
+            error=error,
+            elapsed=time.perf_counter() - started if elapsed is None else elapsed,
+            bytes_sent=(
+                0 if r is None else int(r.request.headers.get("Content-Length", 0))
+            ),
+            bytes_received=received,
+        )
+
+    async def _send(self, searchtype, request):
+        """Send a request through the limiter, retrying it as the retry policy allows"""
+        attempt = 1
+        while True:
+            self._emit("request_start", searchtype=searchtype, attempt=attempt)
+            started, r = time.perf_counter(), None
+            try:
+                async with self._limit(searchtype):
+                    # Time the request itself, not the wait for a slot
+                    started = time.perf_counter()
+                    r = await request()
+                    self._raise_for_status(r)
+                self._request_end(searchtype, attempt, started, r)
+                return r
+
+            except httpx.HTTPError as err:
+                self._request_end(searchtype, attempt, started, r, err)
+                if self._retry is None or not self._retry.should_retry(attempt, err):
+                    raise
+                self._emit("retry", searchtype=searchtype, attempt=attempt, error=err)
+
+            await self._retry.sleep(attempt)
+            attempt += 1
+
+    async def aclose(self):
+        """Close the connection pool, if this class created it."""
+        client, self._client = self._client, None
+        self._client_loop = None
+        if client is not None and self._owns_client:
+            await client.aclose()
+
     def _geturl(self, searchtype, returntype=None):
         """Construct an URL for the geocoder."""
         returntype = returntype or self.returntypes[0]
@@ -96,30 +1863,241 @@ class AsyncCensusGeocode:
         returntype = kwargs.get("returntype", "geographies")
         url = self._geturl(searchtype, returntype)
 
-        try:
-            async with AsyncClient() as client:
-                r = await client.get(url, params=fields, timeout=kwargs.get("timeout"))
-            content = r.json()
-            if "addressMatches" in content.get("result", {}):
-                return AddressResult(content)
+        microbatched = (
+            searchtype == "address"
+            and self._microbatch is not None
+            and "layers" not in kwargs
+        )
 
-            if "geographies" in content.get("result", {}):
-                return GeographyResult(content)
+        key = None
+        if self._cache is not None or self._coalesce:
+            key = self._cache_key(searchtype, returntype, fields)
+            if self._layers is not None:
+                key += (("_layers", tuple(sorted(self._layers))),)
+            if microbatched:
+                # Results built from batch rows hold less than a single lookup's, so
+                # they must not answer lookups of geocoders that don't micro-batch
+                key += (("_microbatch", True),)
 
-            raise ValueError()
+        if self._cache is not None:
+            result = self._cache.get(key)
+            self._emit(
+                "cache",
+                searchtype=searchtype,
+                hits=int(result is not None),
+                misses=int(result is None),
+            )
+            if result is not None:
+                return result
+
+        if microbatched:
+            request = functools.partial(self._microbatched, url, fields, key, **kwargs)
+        else:
+            request = functools.partial(
+                self._request, searchtype, url, fields, key, **kwargs
+            )
+
+        if not self._coalesce:
+            return await request()
+        return await self._coalesced(key, searchtype, request)
+
+    async def _request(self, searchtype, url, fields, key, **kwargs):
+        """Send a lookup, parse the response and cache the result"""
+        try:
+            client = self._get_client()
+            r = await self._send(
+                searchtype,
+                lambda: client.get(
+                    url,
+                    params=fields,
+                    timeout=kwargs.get("timeout", httpx.USE_CLIENT_DEFAULT),
+                ),
+            )
+            started = time.perf_counter()
+            result = _parse_response(self.decoder(r.content), self._layers)
+            self._emit(
+                "parse", searchtype=searchtype, elapsed=time.perf_counter() - started
+            )
 
         except (ValueError, KeyError):
             raise ValueError("Unable to parse response from Census")
 
-        except RequestError as err:
+        except httpx.RequestError as err:
             raise err
 
-    def coordinates(self, x, y, **kwargs):
+        if self._cache is not None:
+            self._cache.set(key, result)
+        return result
+
+    async def _microbatched(self, url, fields, key, **kwargs):
+        """Queue an address lookup to be sent with others in one batch upload"""
+        # Lookups are only batched with others of the same returntype and timeout
+        timeout = kwargs.get("timeout", httpx.USE_CLIENT_DEFAULT)
+        batch = (kwargs.get("returntype", "geographies"), repr(timeout))
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queued = self._queued.setdefault(batch, [])
+        queued.append((url, fields, key, kwargs, future))
+        if len(queued) >= self._microbatch.max_rows:
+            self._flush_queued(batch)
+        elif len(queued) == 1:
+            self._flush_timers[batch] = loop.call_later(
+                self._microbatch.window, self._flush_queued, batch
+            )
+        return await future
+
+    def _flush_queued(self, batch):
+        """Start sending the lookups queued for a batch"""
+        timer = self._flush_timers.pop(batch, None)
+        if timer is not None:
+            timer.cancel()
+        queued = self._queued.pop(batch, None)
+        if queued:
+            task = asyncio.ensure_future(self._send_queued(queued))
+            self._flushing.add(task)
+            task.add_done_callback(self._flushing.discard)
+
+    async def _send_queued(self, queued):
+        """
+        Send queued address lookups as one batch upload and resolve each caller's
+        future from its row. Lookups are sent one by one when there are too few to be
+        worth a batch, when their row is missing from the response, or when it is a
+        Tie, as only a single lookup gives the candidate matches.
+        """
+        queued = [item for item in queued if not item[-1].done()]
+        singles = queued
+        if len(queued) >= self._microbatch.min_rows:
+            kwargs = queued[0][3]
+            rows = [
+                {"id": i, **{name: fields.get(name) for name in self.batchinput[1:]}}
+                for i, (_, fields, _, _, _) in enumerate(queued)
+            ]
+            ties = set()
+            try:
+                result = await self._post_batch(
+                    data=rows,
+                    ties=ties,
+                    returntype=kwargs.get("returntype", "geographies"),
+                    timeout=kwargs.get("timeout", httpx.USE_CLIENT_DEFAULT),
+                )
+            except Exception as err:
+                for *_, future in queued:
+                    if not future.done():
+                        future.set_exception(err)
+                return
+
+            found = {str(row["id"]): row for row in result}
+            singles = []
+            for i, item in enumerate(queued):
+                row = found.get(str(i))
+                if row is None or str(i) in ties:
+                    singles.append(item)
+                    continue
+                _, fields, key, _, future = item
+                value = self._batch_address_result(row, fields)
+                if self._cache is not None:
+                    self._cache.set(key, value)
+                if not future.done():
+                    future.set_result(value)
+
+        async def single(url, fields, key, kwargs, future):
+            try:
+                value = await self._request("address", url, fields, key, **kwargs)
+            except Exception as err:
+                if not future.done():
+                    future.set_exception(err)
+                return
+            if not future.done():
+                future.set_result(value)
+
+        await asyncio.gather(*(single(*item) for item in singles))
+
+    def _batch_address_result(self, row, fields):
+        """Give the AddressResult of a micro-batched lookup, built from its batch row"""
+        matches = []
+        if row["match"] and row["lat"] is not None:
+            match = {
+                "matchedAddress": row["parsed"],
+                "coordinates": {"x": row["lon"], "y": row["lat"]},
+                "tigerLine": {"tigerLineId": row["tigerlineid"], "side": row["side"]},
+            }
+            if row.get("block") and (
+                self._layers is None or BLOCK_LAYER in self._layers
+            ):
+                codes = (row["statefp"], row["countyfp"], row["tract"], row["block"])
+                block = dict(zip(("STATE", "COUNTY", "TRACT", "BLOCK"), codes))
+                block["GEOID"] = "".join(codes)
+                match["geographies"] = {BLOCK_LAYER: [block]}
+            matches.append(match)
+
+        address = {
+            name: fields[name] for name in self.batchinput[1:] if fields.get(name)
+        }
+        return AddressResult(
+            {"result": {"input": {"address": address}, "addressMatches": matches}}
+        )
+
+    async def _coalesced(self, key, searchtype, request):
+        """
+        Await the in-flight request for key, starting it with request() if there is
+        none, so identical concurrent lookups share one request and its result or error.
+        A cancelled caller stops waiting without cancelling the request, unless it was
+        the last one waiting.
+        """
+        loop = asyncio.get_running_loop()
+        flight = self._inflight.get(key)
+        if flight is None or flight[0].get_loop() is not loop:
+            task = loop.create_task(request())
+            task.add_done_callback(functools.partial(self._landed, key))
+            flight = self._inflight[key] = [task, 0]
+        else:
+            self._emit("coalesce", searchtype=searchtype)
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if flight[1] == 1 and not task.done():
+                # Callers arriving while it is cancelled start a new request
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                task.cancel()
+            raise
+        finally:
+            flight[1] -= 1
+
+    def _landed(self, key, task):
+        """Forget a finished request, so later lookups send a new one"""
+        flight = self._inflight.get(key)
+        if flight is not None and flight[0] is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Retrieved by the waiters, or by nobody if they were all cancelled
+            task.exception()
+
+    @staticmethod
+    def _cache_key(searchtype, returntype, fields):
+        """Build a cache key from the normalized request fields"""
+        return (searchtype, returntype) + tuple(
+            (name, _normalize(value)) for name, value in sorted(fields.items())
+        )
+
+    async def coordinates(self, x, y, **kwargs):
         """Geocode a (lon, lat) coordinate."""
         kwargs["returntype"] = "geographies"
+
+        if self._boundaries is not None:
+            layers = kwargs.get("layers")
+            if layers is None and self._layers is not None:
+                layers = ",".join(sorted(self._layers))
+            result = self._boundaries.coordinates(x, y, layers)
+            if result is not None:
+                return result
+
         fields = {"x": x, "y": y}
 
-        return self._fetch("coordinates", fields, **kwargs)
+        return await self._fetch("coordinates", fields, **kwargs)
 
     def address(self, street, city=None, state=None, **kwargs):
         """Geocode an address."""
@@ -130,17 +2108,111 @@ class AsyncCensusGeocode:
             "zip": kwargs.get("zip") or kwargs.get("zipcode"),
         }
 
-        return self._fetch("address", fields, **kwargs)
+        return self._fetch("address", fields, **kwargs)
+
+    def onelineaddress(self, address, **kwargs):
+        """Geocode an an address passed as one string.
+        e.g. "4600 Silver Hill Rd, Suitland, MD 20746"
+        """
+        fields = {
+            "address": address,
+        }
+
+        return self._fetch("onelineaddress", fields, **kwargs)
+
+    async def _map(self, call, items, concurrency, ordered):
+        """
+        Run call on each item of a sync or async iterable with bounded concurrency,
+        yielding (item, result) pairs where result is the exception for failed items.
+        """
+        if hasattr(items, "__aiter__"):
+            iterator = items.__aiter__()
+
+            async def take():
+                try:
+                    return True, await iterator.__anext__()
+                except StopAsyncIteration:
+                    return False, None
+
+        else:
+            iterator = iter(items)
+
+            async def take():
+                for item in iterator:
+                    return True, item
+                return False, None
+
+        async def run(item):
+            try:
+                return item, await call(item)
+            except Exception as err:
+                return item, err
+
+        running = deque()
+        more = True
+        try:
+            while True:
+                while more and len(running) < concurrency:
+                    more, item = await take()
+                    if more:
+                        running.append(asyncio.ensure_future(run(item)))
+
+                if not running:
+                    return
+
+                if ordered:
+                    yield await running.popleft()
+                    continue
+
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    running.remove(task)
+                    yield task.result()
+
+        finally:
+            for task in running:
+                task.cancel()
+
+    def geocode_many(
+        self, addresses, concurrency=DEFAULT_CONCURRENCY, ordered=True, **kwargs
+    ):
+        """
+        Geocode many addresses with at most `concurrency` requests at once.
+
+        `addresses` is an iterable or async iterable of one-line address strings, or of
+        dicts of `address()` arguments (street, city, state, zip). Yields (address, result)
+        pairs, in input order or, with `ordered=False`, as lookups complete. A lookup that
+        fails yields its exception as the result instead of stopping the others.
+
+        >>> async for address, result in acg.geocode_many(addresses, returntype='locations'):
+        ...     if isinstance(result, Exception):
+        ...         continue
+        """
+
+        def call(address):
+            if isinstance(address, dict):
+                return self.address(**address, **kwargs)
+            return self.onelineaddress(address, **kwargs)
 
-    def onelineaddress(self, address, **kwargs):
-        """Geocode an an address passed as one string.
-        e.g. "4600 Silver Hill Rd, Suitland, MD 20746"
+        return self._map(call, addresses, concurrency, ordered)
+
+    def coordinates_many(
+        self, points, concurrency=DEFAULT_CONCURRENCY, ordered=True, **kwargs
+    ):
         """
-        fields = {
-            "address": address,
-        }
+        Geocode many (lon, lat) coordinates with at most `concurrency` requests at once.
 
-        return self._fetch("onelineaddress", fields, **kwargs)
+        `points` is an iterable or async iterable of (x, y) pairs. Yields (point, result)
+        pairs as `geocode_many` does.
+        """
+        return self._map(
+            lambda point: self.coordinates(*point, **kwargs),
+            points,
+            concurrency,
+            ordered,
+        )
 
     def set_benchmark(self, benchmark):
         """Set the Census Geocoding API benchmark the class will use.
@@ -164,55 +2236,112 @@ class AsyncCensusGeocode:
         See: https://geocoding.geo.census.gov/geocoder/vintages?form"""
         return getattr(self, "_vintage")
 
-    def _parse_batch_result(self, data, returntype):
-        """Parse the batch address results returned from the Census Geocoding API"""
+    @property
+    def cache(self):
+        """Give the result cache the class is using, if any."""
+        return self._cache
+
+    @property
+    def limiter(self):
+        """Give the concurrency limiter the class is using, if any."""
+        return self._limiter
+
+    @property
+    def layers(self):
+        """Give the geography layers results are filtered to, if any."""
+        return self._layers
+
+    @property
+    def decoder(self):
+        """Give the JSON decoder used for responses."""
+        return self._decoder or _default_decoder()
+
+    @property
+    def hooks(self):
+        """Give the list of hooks called with request events. It can be added to."""
+        return self._hooks
+
+    @property
+    def retry(self):
+        """Give the retry policy the class is using, if any."""
+        return self._retry
+
+    def _batch_fieldnames(self, returntype):
+        """Give the fields of a batch result row for a returntype"""
         try:
-            fieldnames = self.batchfields[returntype]
+            return self.batchfields[returntype]
         except KeyError as err:
             raise ValueError("unknown returntype: {}".format(returntype)) from err
 
-        # Use the CSV header row for fieldnames, not a hardcoded list
-        def parse(row):
-            row["lat"], row["lon"] = None, None
+    @staticmethod
+    def _parse_batch_row(row):
+        """Convert the coordinate and match fields of a batch result row"""
+        row["lat"], row["lon"] = None, None
 
-            if row.get("coordinate"):
-                try:
-                    row["lon"], row["lat"] = tuple(
-                        float(a) for a in row["coordinate"].split(",")
-                    )
-                except Exception:
-                    pass
-                del row["coordinate"]
+        if row.get("coordinate"):
+            try:
+                row["lon"], row["lat"] = tuple(
+                    float(a) for a in row["coordinate"].split(",")
+                )
+            except Exception:
+                pass
+            del row["coordinate"]
 
-            if "match" in row:
-                row["match"] = row["match"] == "Match"
-            return row
+        if "match" in row:
+            row["match"] = row["match"] == "Match"
+        return row
+
+    def _parse_batch_result(self, data, returntype, counts=None, ties=None):
+        """
+        Parse the batch address results returned from the Census Geocoding API,
+        counting rows by match status (Match, No_Match, Tie) into counts if given, and
+        adding the ids of Tie rows to the set ties if given
+        """
+        fieldnames = self._batch_fieldnames(returntype)
 
         # return as list of dicts
         with io.StringIO(data) as f:
             reader = csv.DictReader(f, fieldnames=fieldnames)
-            return [parse(row) for row in reader]
+            if counts is None and ties is None:
+                return [self._parse_batch_row(row) for row in reader]
+            rows = []
+            for row in reader:
+                if counts is not None:
+                    counts[row.get("match")] += 1
+                if ties is not None and row.get("match") == "Tie":
+                    ties.add(row["id"])
+                rows.append(self._parse_batch_row(row))
+            return rows
+
+    def _batch_parsed(self, elapsed, rows_sent, counts):
+        """Emit the parse and batch events of a batch response"""
+        if not self._hooks:
+            return
+        self._emit("parse", searchtype="addressbatch", elapsed=elapsed)
+        self._emit(
+            "batch",
+            rows_sent=rows_sent,
+            rows_received=sum(counts.values()),
+            matched=counts["Match"],
+            unmatched=counts["No_Match"],
+            tied=counts["Tie"],
+        )
 
-    async def _post_batch(self, data=None, f=None, **kwargs):
-        """Send batch address file to the Census Geocoding API"""
+    async def _post_batch(self, data=None, f=None, compact=False, ties=None, **kwargs):
+        """
+        Send batch address file to the Census Geocoding API. Without compact, the ids
+        of Tie rows are added to the set ties if given.
+        """
         returntype = kwargs.get("returntype", "geographies")
         url = self._geturl("addressbatch", returntype)
 
         if data:
-            # For Python 3, compile data into a StringIO
-            f = io.StringIO()
-            writer = csv.DictWriter(
-                f, fieldnames=["id", "street", "city", "state", "zip"]
-            )
-            for i, row in enumerate(data, 1):
-                row.setdefault("id", i)
-                writer.writerow(row)
-                if i == 10001:
-                    warnings.warn(
-                        "Sending more than 10,000 records, the upper limit for the Census Geocoder. Request will likely fail"
-                    )
-
-            f.seek(0)
+            rows = list(self._batch_rows(data))
+            if len(rows) > BATCH_LIMIT:
+                warnings.warn(
+                    "Sending more than 10,000 records, the upper limit for the Census Geocoder. Request will likely fail"
+                )
+            f = self._batch_file(rows)
 
         elif f is None:
             raise ValueError(
@@ -228,62 +2357,850 @@ class AsyncCensusGeocode:
                 "vintage": self.vintage,
                 "benchmark": self.benchmark,
             }
-            async with AsyncClient() as client:
-                r = await client.post(
-                    url, data=data, files=files, timeout=kwargs.get("timeout")
+            client = self._get_client()
+            seekable = getattr(f, "seekable", lambda: False)()
+            start = f.tell() if seekable else None
+
+            def post():
+                # Rewind the file for retries
+                if seekable:
+                    f.seek(start)
+                return client.post(
+                    url,
+                    data=data,
+                    files=files,
+                    timeout=kwargs.get("timeout", httpx.USE_CLIENT_DEFAULT),
                 )
+
+            r = await self._send("addressbatch", post)
+            started = time.perf_counter()
+            counts = Counter() if self._hooks else None
+            if compact:
+                result = BatchResult.from_csv(r.text, returntype, counts)
+            else:
                 # return as list of dicts
-                return self._parse_batch_result(r.text, returntype)
+                result = self._parse_batch_result(r.text, returntype, counts, ties)
+            self._batch_parsed(
+                time.perf_counter() - started, len(getattr(f, "rows", ())), counts
+            )
+            return result
 
-        except RequestError as err:
+        except httpx.RequestError as err:
             raise err
 
         finally:
             f.close()
 
-    def addressbatch(self, data, **kwargs):
+    def _batch_rows(self, data=None, f=None):
+        """Yield [id, street, city, state, zip] rows from a CSV file or an iterable of dicts"""
+        if f is not None:
+            if isinstance(f.read(0), bytes):
+                f = io.TextIOWrapper(f, encoding="utf-8", newline="")
+            yield from (row for row in csv.reader(f) if row)
+            return
+
+        for i, row in enumerate(data, 1):
+            yield self._batch_row(i, row)
+
+    def _batch_row(self, i, row):
+        """Give the [id, street, city, state, zip] row for the i-th dict of batch data"""
+        row.setdefault("id", i)
+        return [row.get(field) for field in self.batchinput]
+
+    def _batch_chunks(self, data, chunksize, dedupe=False):
+        """
+        Read batch input (a path, file handle or iterable of dicts) in chunks of rows.
+        With dedupe, each chunk holds up to chunksize distinct normalized addresses,
+        however many rows share them.
+        """
+        chunker = _Chunker(chunksize, dedupe)
+
+        f = None
+        if hasattr(data, "read"):
+            f, data = data, None
+        elif isinstance(data, str):
+            f, data = open(data, "rb"), None
+
+        try:
+            for row in self._batch_rows(data, f):
+                chunk = chunker.add(row)
+                if chunk:
+                    yield chunk
+            chunk = chunker.flush()
+            if chunk:
+                yield chunk
+
+        finally:
+            if f is not None:
+                f.close()
+
+    async def _batch_chunks_async(self, data, chunksize, dedupe=False):
+        """
+        Like `_batch_chunks`, as an async generator that also reads async iterables of
+        dicts, such as the output of another async pipeline stage
+        """
+        if not hasattr(data, "__aiter__"):
+            chunks = self._batch_chunks(data, chunksize, dedupe)
+            try:
+                for chunk in chunks:
+                    yield chunk
+            finally:
+                chunks.close()
+            return
+
+        chunker = _Chunker(chunksize, dedupe)
+        i = 0
+        async for row in data:
+            i += 1
+            chunk = chunker.add(self._batch_row(i, row))
+            if chunk:
+                yield chunk
+        chunk = chunker.flush()
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _batch_file(rows):
+        """Give a file that encodes batch rows to CSV as httpx uploads it"""
+        return _BatchUpload(rows)
+
+    def _batch_cache_key(self, returntype, row):
+        """Build a cache key for a batch row from its normalized address"""
+        return (
+            "addressbatch",
+            returntype,
+            _normalize(self.benchmark),
+            _normalize(self.vintage),
+        ) + tuple(_normalize(value) for value in row[1:5])
+
+    def _batch_cache_get(self, rows, returntype):
+        """Give the cache keys of batch rows and their cached results, None for misses"""
+        if self._cache is None:
+            return [None] * len(rows), [None] * len(rows)
+        keys = [self._batch_cache_key(returntype, row) for row in rows]
+        hits = self._cache.get_many(keys)
+        misses = hits.count(None)
+        self._emit(
+            "cache", searchtype="addressbatch", hits=len(hits) - misses, misses=misses
+        )
+        return keys, hits
+
+    def _batch_cache_set(self, keys, result):
+        """Cache batch result rows, given a mapping of row ids to cache keys"""
+        if self._cache is None:
+            return
+        self._cache.set_many(
+            (keys[row["id"]], {k: v for k, v in row.items() if k != "id"})
+            for row in result
+            if row.get("id") in keys
+        )
+
+    @staticmethod
+    def _unique_rows(rows):
+        """
+        Collapse rows with the same normalized address to the first of them. Gives the
+        unique rows and, for each row, the position of its unique row.
+        """
+        unique, index, positions = [], [], {}
+        for row in rows:
+            i = positions.setdefault(normalize_address(*row[1:5]), len(unique))
+            if i == len(unique):
+                unique.append(row)
+            index.append(i)
+        return unique, index
+
+    async def _post_chunk(self, rows, dedupe=False, compact=False, **kwargs):
+        """
+        Send one chunk of batch rows and return its results in the order of the rows.
+        With compact, the responses are parsed into BatchResults and reordered column by
+        column, so a BatchResult is returned without building an object per row.
+        """
+        returntype = kwargs.get("returntype", "geographies")
+        if dedupe:
+            unique, index = self._unique_rows(rows)
+        else:
+            unique, index = rows, range(len(rows))
+
+        keys, hits = self._batch_cache_get(unique, returntype)
+        misses = {
+            str(row[0]): key for row, key, hit in zip(unique, keys, hits) if hit is None
+        }
+
+        # The Census does not return rows in the order they were sent, so note the
+        # position of each id among all the rows received
+        responses, returned, received = [], {}, 0
+        pending = [row for row, hit in zip(unique, hits) if hit is None]
+        attempt = 1
+        while pending:
+            result = await self._post_batch(
+                f=self._batch_file(pending), compact=compact, **kwargs
+            )
+            self._batch_cache_set(misses, result)
+            ids = result.strings["id"] if compact else (row.get("id") for row in result)
+            for position, id_ in enumerate(ids, received):
+                returned.setdefault(id_, []).append(position)
+            responses.append(result)
+            received += len(result)
+
+            # Resend rows missing from the response
+            pending = [row for row in pending if str(row[0]) not in returned]
+            if not pending or not (self._retry and self._retry.should_retry(attempt)):
+                break
+            self._emit("retry", searchtype="addressbatch", attempt=attempt, error=None)
+            await self._retry.sleep(attempt)
+            attempt += 1
+
+        # Cached rows follow the received rows
+        found, cached = [], []
+        for row, hit in zip(unique, hits):
+            if hit is not None:
+                found.append(received + len(cached))
+                cached.append(hit)
+            elif returned.get(str(row[0])):
+                found.append(returned[str(row[0])].pop(0))
+            else:
+                found.append(None)
+
+        positions, ids = [], []
+        for row, i in zip(rows, index):
+            if found[i] is not None:
+                positions.append(found[i])
+                ids.append(str(row[0]))
+        unmatched = [position for left in returned.values() for position in left]
+
+        if compact:
+            if cached:
+                responses.append(BatchResult.from_rows(cached, returntype))
+            if len(responses) == 1:
+                joined = responses[0]
+            else:
+                joined = BatchResult.concat(responses, returntype)
+            merged = joined.take(positions + unmatched)
+            # Cached rows and duplicates take the row's own id
+            merged.strings["id"][: len(ids)] = ids
+            return merged
+
+        results = [row for result in responses for row in result] + cached
+        merged = []
+        for position, id_ in zip(positions, ids):
+            # Cached rows and duplicates are copies under the row's own id
+            row = results[position]
+            merged.append(row if row.get("id") == id_ else dict(row, id=id_))
+        merged.extend(results[position] for position in unmatched)
+        return merged
+
+    def _chunk_digest(self, chunk, dedupe, **kwargs):
+        """Fingerprint a chunk of batch rows for a checkpoint journal"""
+        return BatchJournal.digest(
+            kwargs.get("returntype", "geographies"),
+            self.benchmark,
+            self.vintage,
+            dedupe,
+            chunk,
+        )
+
+    async def _post_batches(
+        self, data, chunksize, concurrency, dedupe, compact, checkpoint=None, **kwargs
+    ):
+        """Split batch input into chunks and send them concurrently"""
+        returntype = kwargs.get("returntype", "geographies")
+        chunks = self._batch_chunks_async(data, chunksize, dedupe)
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = []
+
+        journal = checkpoint
+        if isinstance(checkpoint, str):
+            journal = BatchJournal(checkpoint)
+
+        async def post(index, chunk):
+            try:
+                if journal is None:
+                    rows = await self._post_chunk(chunk, dedupe, compact, **kwargs)
+                else:
+                    digest = self._chunk_digest(chunk, dedupe, **kwargs)
+                    rows = journal.get(index, digest)
+                    if rows is None:
+                        journal.submitted(index, digest)
+                        rows = await self._post_chunk(chunk, dedupe, compact, **kwargs)
+                        journal.completed(index, digest, rows)
+                if compact and not isinstance(rows, BatchResult):
+                    # Rows answered from the journal are dicts
+                    return BatchResult.from_rows(rows, returntype)
+                return rows
+            finally:
+                semaphore.release()
+
+        try:
+            # Only read the next chunk once there is a free slot to send it
+            while True:
+                await semaphore.acquire()
+                for task in tasks:
+                    if task.done() and task.exception():
+                        raise task.exception()
+
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+                tasks.append(asyncio.ensure_future(post(len(tasks), chunk)))
+
+            results = await asyncio.gather(*tasks)
+
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        finally:
+            await chunks.aclose()
+            if journal is not checkpoint:
+                journal.close()
+
+        if compact:
+            return BatchResult.concat(results, returntype)
+        return [row for result in results for row in result]
+
+    async def _stream_batch(self, f, attempt=1, **kwargs):
+        """Send batch address file to the Census Geocoding API and yield rows as they arrive"""
+        returntype = kwargs.get("returntype", "geographies")
+        url = self._geturl("addressbatch", returntype)
+        fieldnames = self._batch_fieldnames(returntype)
+
+        counts = Counter() if self._hooks else None
+        # Only time spent waiting on the Census counts, not on the consumer of the rows
+        r, error, parsing, receiving = None, None, 0.0, 0.0
+        self._emit("request_start", searchtype="addressbatch", attempt=attempt)
+        started = time.perf_counter()
+
+        try:
+            files = {
+                "addressFile": ("batch.csv", f, "text/plain"),
+            }
+            data = {
+                "vintage": self.vintage,
+                "benchmark": self.benchmark,
+            }
+            client = self._get_client()
+            async with self._limit("addressbatch") as slot:
+                started = time.perf_counter()
+                async with client.stream(
+                    "POST",
+                    url,
+                    data=data,
+                    files=files,
+                    timeout=kwargs.get("timeout", httpx.USE_CLIENT_DEFAULT),
+                ) as r:
+                    receiving = time.perf_counter() - started
+                    self._raise_for_status(r)
+                    lines = r.aiter_lines()
+                    while True:
+                        receive_started = time.perf_counter()
+                        try:
+                            line = await lines.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            receiving += time.perf_counter() - receive_started
+
+                        if counts is None:
+                            for row in csv.DictReader([line], fieldnames=fieldnames):
+                                yield self._parse_batch_row(row)
+                            continue
+
+                        parse_started = time.perf_counter()
+                        rows = []
+                        for row in csv.DictReader([line], fieldnames=fieldnames):
+                            counts[row.get("match")] += 1
+                            rows.append(self._parse_batch_row(row))
+                        parsing += time.perf_counter() - parse_started
+                        for row in rows:
+                            yield row
+
+                slot["latency"] = receiving
+
+        except httpx.HTTPError as err:
+            error = err
+            raise
+
+        finally:
+            f.close()
+            if self._hooks:
+                if error is not None:
+                    receiving = time.perf_counter() - started
+                self._request_end("addressbatch", attempt, started, r, error, receiving)
+                if error is None:
+                    self._batch_parsed(parsing, len(getattr(f, "rows", ())), counts)
+
+    async def _stream_chunk(
+        self, rows, queue, dedupe=False, on_complete=None, **kwargs
+    ):
+        """
+        Stream the results of one chunk of batch rows into a queue, ending with None.
+        If the chunk succeeds, on_complete is called with a copy of every row sent.
+        """
+        sent = []
+
+        def put(row):
+            if on_complete is not None:
+                sent.append(dict(row))
+            queue.put_nowait(row)
+
+        try:
+            if dedupe:
+                unique, index = self._unique_rows(rows)
+            else:
+                unique, index = rows, range(len(rows))
+
+            # ids of every row sharing each unique row's address
+            ids = [[] for _ in unique]
+            for row, i in zip(rows, index):
+                ids[i].append(str(row[0]))
+
+            keys, hits = self._batch_cache_get(
+                unique, kwargs.get("returntype", "geographies")
+            )
+            misses, fanout = {}, {}
+            for row, key, hit, row_ids in zip(unique, keys, hits, ids):
+                if hit is None:
+                    misses[str(row[0])] = key
+                    fanout[str(row[0])] = row_ids
+                else:
+                    for row_id in row_ids:
+                        put(dict(hit, id=row_id))
+
+            pending = [row for row, hit in zip(unique, hits) if hit is None]
+            attempt = 1
+            while pending:
+                # Copies of the rows are only kept to cache them
+                received, result, error = set(), [], None
+                try:
+                    async for row in self._stream_batch(
+                        self._batch_file(pending), attempt, **kwargs
+                    ):
+                        received.add(row.get("id"))
+                        if self._cache is not None:
+                            result.append(dict(row))
+                        row_ids = fanout.get(row.get("id"), [row.get("id")])
+                        put(row)
+                        for row_id in row_ids[1:]:
+                            put(dict(row, id=row_id))
+                except httpx.HTTPError as err:
+                    error = err
+                self._batch_cache_set(misses, result)
+
+                # Resend only the rows that have not arrived yet
+                pending = [row for row in pending if str(row[0]) not in received]
+                if not pending:
+                    break
+                if not (self._retry and self._retry.should_retry(attempt, error)):
+                    if error is not None:
+                        raise error
+                    break
+                self._emit(
+                    "retry", searchtype="addressbatch", attempt=attempt, error=error
+                )
+                await self._retry.sleep(attempt)
+                attempt += 1
+
+            if on_complete is not None:
+                on_complete(sent)
+
+        except Exception as err:
+            queue.put_nowait(err)
+        queue.put_nowait(None)
+
+    def addressbatch(
+        self,
+        data,
+        chunksize=BATCH_LIMIT,
+        concurrency=DEFAULT_BATCH_CONCURRENCY,
+        dedupe=False,
+        compact=False,
+        checkpoint=None,
+        **kwargs,
+    ):
         """
         Send either a CSV file or data to the addressbatch API.
 
         According to the Census, "there is currently an upper limit of 10,000 records per batch file."
+        Larger inputs are split into chunks of `chunksize` rows (at most 10,000), and up to
+        `concurrency` chunks are sent at once. Results are returned in input order.
 
         If a file, can either be a file-like with a `read()` method, or a `str` that's a path to the
         file. Either way, it must have no header and have fields id,street,city,state,zip
 
         If data, should be an iterable of dicts with the above fields (although ID is optional).
+
+        With `dedupe=True`, rows in a chunk whose addresses are the same once normalized with
+        `normalize_address` are sent once, as the first of them was given. Every row still
+        gets a result under its own id. Use a cache to also avoid resending addresses repeated across chunks.
+
+        With `compact=True`, returns a columnar `BatchResult` instead of a list of dicts,
+        parsed straight from the response CSV. It can be exported with `to_numpy`,
+        `to_pandas` or `to_arrow`.
+
+        With `checkpoint`, a `BatchJournal` or the path of one, completed chunks are
+        recorded as the job runs. Running the job again with the same journal skips
+        the chunks that completed and sends only the rest.
         """
-        # Does data quack like a file handle?
-        if hasattr(data, "read"):
-            return self._post_batch(f=data, **kwargs)
+        return self._post_batches(
+            data, chunksize, concurrency, dedupe, compact, checkpoint, **kwargs
+        )
+
+    async def addressbatch_iter(
+        self,
+        data,
+        chunksize=BATCH_LIMIT,
+        concurrency=DEFAULT_BATCH_CONCURRENCY,
+        dedupe=False,
+        compact=False,
+        ordered=True,
+        checkpoint=None,
+        **kwargs,
+    ):
+        """
+        Like `addressbatch`, but yield result rows one at a time as the Census sends them.
+
+        Responses are streamed and parsed line by line, so rows can be written out before
+        a chunk has finished downloading. Chunks are yielded in input order, and rows within
+        a chunk in the order the Census returns them. At most `concurrency` chunks are held
+        in flight or buffered at once, so memory does not grow with the size of the input.
+
+        >>> async for row in acg.addressbatch_iter('data/addresses.csv'):
+        ...     writer.writerow(row)
+
+        With `ordered=False`, rows are yielded as they arrive from any chunk in flight, so
+        one slow chunk does not hold back the rows of the others.
+
+        With `checkpoint`, completed chunks are journaled as in `addressbatch`. On a
+        rerun, the rows of chunks that completed are yielded from the journal.
+
+        With `compact=True`, yields one `BatchResult` per chunk instead, once the chunk is
+        complete, so each can be exported and written out on its own.
+
+        >>> async for part in acg.addressbatch_iter('data/addresses.csv', compact=True):
+        ...     parquet_writer.write_table(part.to_arrow())
+        """
+        if compact and not ordered:
+            raise ValueError("compact results are yielded per chunk, in input order")
+
+        returntype = kwargs.get("returntype", "geographies")
+        chunks = self._batch_chunks_async(data, chunksize, dedupe)
+        semaphore = asyncio.Semaphore(concurrency)
+        # One entry per chunk. Unordered, every chunk shares one queue, so each entry
+        # stands for whichever chunk finishes next.
+        pending = asyncio.Queue()
+        shared = None if ordered else asyncio.Queue()
+        tasks = []
+
+        journal = checkpoint
+        if isinstance(checkpoint, str):
+            journal = BatchJournal(checkpoint)
+
+        async def schedule():
+            index = -1
+            try:
+                while True:
+                    # A slot is freed once the consumer has read every row of a chunk
+                    await semaphore.acquire()
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    index += 1
+                    queue = asyncio.Queue() if shared is None else shared
+
+                    on_complete = None
+                    if journal is not None:
+                        digest = self._chunk_digest(chunk, dedupe, **kwargs)
+                        rows = journal.get(index, digest)
+                        if rows is not None:
+                            # Replay a chunk completed by an earlier run
+                            for row in rows:
+                                queue.put_nowait(row)
+                            queue.put_nowait(None)
+                            pending.put_nowait(queue)
+                            continue
+                        journal.submitted(index, digest)
+                        on_complete = functools.partial(
+                            journal.completed, index, digest
+                        )
+
+                    tasks.append(
+                        asyncio.ensure_future(
+                            self._stream_chunk(
+                                chunk, queue, dedupe, on_complete, **kwargs
+                            )
+                        )
+                    )
+                    pending.put_nowait(queue)
+            except Exception as err:
+                pending.put_nowait(err)
+            pending.put_nowait(None)
+
+        scheduler = asyncio.ensure_future(schedule())
+        try:
+            while True:
+                queue = await pending.get()
+                if queue is None:
+                    break
+                if isinstance(queue, Exception):
+                    raise queue
+
+                part = BatchResult(returntype) if compact else None
+                while True:
+                    row = await queue.get()
+                    if row is None:
+                        break
+                    if isinstance(row, Exception):
+                        raise row
+                    if compact:
+                        part.append(row)
+                    else:
+                        yield row
+
+                semaphore.release()
+                if compact:
+                    yield part
+
+        finally:
+            scheduler.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(scheduler, *tasks, return_exceptions=True)
+            await chunks.aclose()
+            if journal is not checkpoint:
+                journal.close()
+
+
+class CensusGeocode:
+    """
+    Blocking interface to the Census Geocoder, for synchronous code.
+
+    Takes the same arguments as `AsyncCensusGeocode`. One event loop runs on a
+    background thread for the life of the instance, with one connection pool, and every
+    call is sent to it, so calls from any number of threads share the pool instead of
+    each starting an event loop and a client with `asyncio.run()`.
+
+    >>> cg = CensusGeocode()
+    >>> cg.onelineaddress('4600 Silver Hill Rd, Suitland, MD 20746')
+
+    The loop is started on first use. Stop it with `close()`, or use the class as a
+    context manager. A process forked from one using the instance starts its own loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._geocoder = AsyncCensusGeocode(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._pid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get_loop(self):
+        """Return the background event loop, starting it on first use"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="CensusGeocode", daemon=True
+                )
+                thread.start()
+                self._loop, self._thread, self._pid = loop, thread, os.getpid()
+            return self._loop
+
+    def _run(self, coro):
+        """Run a coroutine on the background loop and wait for its result"""
+        loop = self._get_loop()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("CensusGeocode can't be called from its own event loop")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def _iterate(self, results):
+        """Iterate an async generator on the background loop"""
+        try:
+            while True:
+                try:
+                    yield self._run(results.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(results.aclose())
+
+    def close(self):
+        """Close the connection pool and stop the background loop."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or self._pid != os.getpid():
+            return
+        asyncio.run_coroutine_threadsafe(self._geocoder.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    def coordinates(self, x, y, **kwargs):
+        """Geocode a (lon, lat) coordinate."""
+        return self._run(self._geocoder.coordinates(x, y, **kwargs))
+
+    def address(self, street, city=None, state=None, **kwargs):
+        """Geocode an address."""
+        return self._run(self._geocoder.address(street, city, state, **kwargs))
+
+    def onelineaddress(self, address, **kwargs):
+        """Geocode an an address passed as one string."""
+        return self._run(self._geocoder.onelineaddress(address, **kwargs))
+
+    def addressbatch(self, data, **kwargs):
+        """Send either a CSV file or data to the addressbatch API. See
+        `AsyncCensusGeocode.addressbatch` for the arguments."""
+        return self._run(self._geocoder.addressbatch(data, **kwargs))
+
+    def geocode_many(
+        self, addresses, concurrency=DEFAULT_CONCURRENCY, ordered=True, **kwargs
+    ):
+        """
+        Geocode many addresses with at most `concurrency` requests at once, yielding
+        (address, result) pairs as `AsyncCensusGeocode.geocode_many` does. Several
+        threads can run it at once, sharing the connection pool.
+
+        >>> for address, result in cg.geocode_many(addresses, concurrency=32):
+        ...     if isinstance(result, Exception):
+        ...         continue
+        """
+        return self._iterate(
+            self._geocoder.geocode_many(addresses, concurrency, ordered, **kwargs)
+        )
+
+    def coordinates_many(
+        self, points, concurrency=DEFAULT_CONCURRENCY, ordered=True, **kwargs
+    ):
+        """
+        Geocode many (lon, lat) coordinates with at most `concurrency` requests at once,
+        yielding (point, result) pairs.
+        """
+        return self._iterate(
+            self._geocoder.coordinates_many(points, concurrency, ordered, **kwargs)
+        )
 
-        # If it is a string, assume it's a filename
-        if isinstance(data, str):
-            with open(data, "rb") as f:
-                return self._post_batch(f=f, **kwargs)
+    def set_benchmark(self, benchmark):
+        """Set the Census Geocoding API benchmark the class will use."""
+        self._geocoder.set_benchmark(benchmark)
+
+    @property
+    def benchmark(self):
+        """Give the Census Geocoding API benchmark the class is using."""
+        return self._geocoder.benchmark
+
+    def set_vintage(self, vintage):
+        """Set the Census Geocoding API vintage the class will use."""
+        self._geocoder.set_vintage(vintage)
+
+    @property
+    def vintage(self):
+        """Give the Census Geocoding API vintage the class is using."""
+        return self._geocoder.vintage
 
-        # Otherwise, assume an iterable of dicts
-        return self._post_batch(data=data, **kwargs)
+    @property
+    def cache(self):
+        """Give the result cache the class is using, if any."""
+        return self._geocoder.cache
 
 
 class GeographyResult(dict):
-    """Wrapper for geography objects returned by the Census Geocoding API"""
+    """
+    Wrapper for geography objects returned by the Census Geocoding API.
 
-    def __init__(self, data):
+    Each layer is converted the first time it is read, when its geographies get float
+    (lon, lat) tuples under CENT and INTPT. With `layers`, only the named layers are kept.
+    """
+
+    def __init__(self, data, layers=None):
         self.input = data["result"].get("input", {})
-        super().__init__(data["result"]["geographies"])
+        geographies = data["result"]["geographies"]
+        if layers is not None:
+            geographies = {k: v for k, v in geographies.items() if k in layers}
+        super().__init__(geographies)
+        self._unconverted = set(geographies)
 
-        # create float coordinate tuples
-        for geolist in self.values():
-            for geo in geolist:
-                try:
-                    geo["CENT"] = float(geo["CENTLON"]), float(geo["CENTLAT"])
-                except ValueError:
-                    geo["CENT"] = ()
+    def _convert(self, key):
+        """Create float coordinate tuples for a layer on first access"""
+        if key not in self._unconverted:
+            return
+        self._unconverted.discard(key)
+        for geo in dict.get(self, key, ()):
+            try:
+                geo["CENT"] = float(geo["CENTLON"]), float(geo["CENTLAT"])
+            except (KeyError, ValueError):
+                geo["CENT"] = ()
 
-                try:
-                    geo["INTPT"] = float(geo["INTPTLON"]), float(geo["INTPTLAT"])
-                except ValueError:
-                    geo["INTPT"] = ()
+            try:
+                geo["INTPT"] = float(geo["INTPTLON"]), float(geo["INTPTLAT"])
+            except (KeyError, ValueError):
+                geo["INTPT"] = ()
+
+    def _convert_all(self):
+        for key in list(self._unconverted):
+            self._convert(key)
+
+    def __getitem__(self, key):
+        self._convert(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._convert(key)
+        return super().get(key, default)
+
+    def pop(self, key, *default):
+        self._convert(key)
+        return super().pop(key, *default)
+
+    def setdefault(self, key, default=None):
+        self._convert(key)
+        return super().setdefault(key, default)
+
+    def popitem(self):
+        self._convert_all()
+        return super().popitem()
+
+    def values(self):
+        self._convert_all()
+        return super().values()
+
+    def items(self):
+        self._convert_all()
+        return super().items()
+
+    def __iter__(self):
+        # Defined so that dict(result) reads the layers through __getitem__
+        return super().__iter__()
+
+    def copy(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        self._convert_all()
+        if isinstance(other, GeographyResult):
+            other._convert_all()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        self._convert_all()
+        if isinstance(other, GeographyResult):
+            other._convert_all()
+        return super().__ne__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._convert_all()
+        return super().__repr__()
 
 
 class AddressResult(list):
@@ -292,3 +3209,261 @@ class AddressResult(list):
     def __init__(self, data):
         self.input = data["result"].get("input", {})
         super().__init__(data["result"]["addressMatches"])
+
+
+class BatchRecord(Mapping):
+    """One row of a `BatchResult`. A read-only mapping that compares equal to the dict
+    `addressbatch` returns for the row."""
+
+    __slots__ = (
+        "_keys",
+        "id",
+        "address",
+        "match",
+        "matchtype",
+        "parsed",
+        "tigerlineid",
+        "side",
+        "statefp",
+        "countyfp",
+        "tract",
+        "block",
+        "lat",
+        "lon",
+    )
+
+    def __init__(self, keys, values):
+        self._keys = keys
+        for key, value in zip(keys, values):
+            setattr(self, key, value)
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return "BatchRecord({!r})".format(dict(self))
+
+
+class BatchResult(Sequence):
+    """
+    Columnar results of an addressbatch request.
+
+    Coordinates are kept in `array('d')` columns (NaN where there is none), match in a
+    `bytearray` of 0 and 1, and the other fields in one list per column, with repeated
+    codes such as matchtype, side and statefp interned. Indexing and iteration give
+    `BatchRecord` rows, which behave like the dicts of a list result.
+    """
+
+    # Columns with few distinct values, which share one string object per value
+    _interned = ("matchtype", "side", "statefp", "countyfp")
+
+    def __init__(self, returntype="geographies"):
+        self.returntype = returntype
+        fields = AsyncCensusGeocode.batchfields[returntype]
+        self.strings = {f: [] for f in fields if f not in ("match", "coordinate")}
+        self.match = bytearray()
+        self.lat = array("d")
+        self.lon = array("d")
+        self.fields = tuple(f for f in fields if f != "coordinate") + ("lat", "lon")
+
+    @classmethod
+    def from_rows(cls, rows, returntype="geographies"):
+        """Build a BatchResult from parsed batch rows (dicts)"""
+        result = cls(returntype)
+        result.extend(rows)
+        return result
+
+    @classmethod
+    def from_csv(cls, text, returntype="geographies", counts=None):
+        """
+        Build a BatchResult straight from the CSV text of a batch response, counting rows
+        by match status into counts if given
+        """
+        result = cls(returntype)
+        fields = AsyncCensusGeocode.batchfields[returntype]
+        match, coordinate = fields.index("match"), fields.index("coordinate")
+        columns = [
+            (i, result.strings[name], name in cls._interned)
+            for i, name in enumerate(fields)
+            if name in result.strings
+        ]
+        padding = [None] * len(fields)
+
+        with io.StringIO(text) as f:
+            for values in csv.reader(f):
+                if not values:
+                    continue
+                # Short rows (unmatched addresses) leave the last fields empty
+                values.extend(padding[len(values) :])
+                for i, column, interned in columns:
+                    value = values[i]
+                    if interned and value is not None:
+                        value = sys.intern(value)
+                    column.append(value)
+                result.match.append(1 if values[match] == "Match" else 0)
+                if counts is not None:
+                    counts[values[match]] += 1
+
+                lon = lat = math.nan
+                if values[coordinate]:
+                    try:
+                        lon, lat = (float(a) for a in values[coordinate].split(","))
+                    except ValueError:
+                        pass
+                result.lat.append(lat)
+                result.lon.append(lon)
+        return result
+
+    @classmethod
+    def concat(cls, results, returntype="geographies"):
+        """Join BatchResults end to end"""
+        joined = cls(returntype)
+        for result in results:
+            for name, column in joined.strings.items():
+                column.extend(result.strings[name])
+            joined.match.extend(result.match)
+            joined.lat.extend(result.lat)
+            joined.lon.extend(result.lon)
+        return joined
+
+    def take(self, indices):
+        """Give a BatchResult of the rows at the given positions, in that order"""
+        result = type(self)(self.returntype)
+        for name, column in self.strings.items():
+            result.strings[name] = [column[i] for i in indices]
+        result.match = bytearray(self.match[i] for i in indices)
+        result.lat = array("d", [self.lat[i] for i in indices])
+        result.lon = array("d", [self.lon[i] for i in indices])
+        return result
+
+    def append(self, row):
+        """Add a parsed batch row (a dict)"""
+        for name, column in self.strings.items():
+            value = row.get(name)
+            if name in self._interned and value is not None:
+                value = sys.intern(value)
+            column.append(value)
+        self.match.append(1 if row.get("match") else 0)
+        lat, lon = row.get("lat"), row.get("lon")
+        self.lat.append(math.nan if lat is None else lat)
+        self.lon.append(math.nan if lon is None else lon)
+
+    def extend(self, rows):
+        """Add parsed batch rows (dicts)"""
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return len(self.match)
+
+    def to_numpy(self):
+        """
+        Give the columns as a dict of numpy arrays: float64 lat and lon (NaN where there
+        is no coordinate), bool match and object arrays for the other fields. The numeric
+        columns share memory with the BatchResult.
+        """
+        try:
+            import numpy as np
+        except ImportError as err:
+            raise ImportError(
+                "BatchResult.to_numpy requires numpy: pip install numpy"
+            ) from err
+
+        columns = {}
+        for name in self.fields:
+            if name in ("lat", "lon"):
+                columns[name] = np.frombuffer(getattr(self, name), dtype=np.float64)
+            elif name == "match":
+                columns[name] = np.frombuffer(self.match, dtype=np.bool_)
+            else:
+                column = np.empty(len(self), dtype=object)
+                column[:] = self.strings[name]
+                columns[name] = column
+        return columns
+
+    def to_pandas(self):
+        """
+        Give a pandas DataFrame with float64 lat and lon, bool match, categorical
+        matchtype and side, and string dtype for the other fields.
+        """
+        try:
+            import pandas as pd
+        except ImportError as err:
+            raise ImportError(
+                "BatchResult.to_pandas requires pandas: pip install pandas"
+            ) from err
+
+        columns = {}
+        for name, column in self.to_numpy().items():
+            if name in ("matchtype", "side"):
+                columns[name] = pd.Categorical(column)
+            elif name in self.strings:
+                columns[name] = pd.array(column, dtype="string")
+            else:
+                columns[name] = column.copy()
+        return pd.DataFrame(columns, columns=list(self.fields))
+
+    def to_arrow(self):
+        """
+        Give a pyarrow Table with float64 lat and lon (null where there is no coordinate),
+        bool match, dictionary encoded matchtype and side, and string columns for the
+        other fields.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError as err:
+            raise ImportError(
+                "BatchResult.to_arrow requires pyarrow: pip install pyarrow"
+            ) from err
+
+        columns = {}
+        for name, column in self.to_numpy().items():
+            if name in ("lat", "lon"):
+                columns[name] = pa.array(column, type=pa.float64(), from_pandas=True)
+            elif name == "match":
+                columns[name] = pa.array(column, type=pa.bool_())
+            else:
+                columns[name] = pa.array(self.strings[name], type=pa.string())
+                if name in ("matchtype", "side"):
+                    columns[name] = columns[name].dictionary_encode()
+        return pa.table(columns)
+
+    def _record(self, i):
+        values = []
+        for name in self.fields:
+            if name == "match":
+                values.append(bool(self.match[i]))
+            elif name in ("lat", "lon"):
+                value = getattr(self, name)[i]
+                values.append(None if math.isnan(value) else value)
+            else:
+                values.append(self.strings[name][i])
+        return BatchRecord(self.fields, values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._record(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("BatchResult index out of range")
+        return self._record(index)
+
+    def __iter__(self):
+        return (self._record(i) for i in range(len(self)))
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return "<BatchResult of {} rows>".format(len(self))
@@ -20,15 +20,83 @@
 
 import sys
 import argparse
-import asyncio
 import csv
-import io
 
-from .async_censusgeocode import DEFAULT_BENCHMARK, DEFAULT_VINTAGE, AsyncCensusGeocode
+from .async_censusgeocode import (
+    BATCH_LIMIT,
+    DEFAULT_BATCH_CONCURRENCY,
+    DEFAULT_BENCHMARK,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_VINTAGE,
+    AsyncCensusGeocode,
+    SQLiteCache,
+)
 
 
-async def main():
-    """Command-line interface for async-censusgeocode"""
+def _field(value):
+    """Parse a --field argument, LAYER:ATTRIBUTE"""
+    layer, sep, attribute = value.rpartition(":")
+    if not sep or not layer or not attribute:
+        raise argparse.ArgumentTypeError(
+            "expected LAYER:ATTRIBUTE, e.g. 'Census Tracts:GEOID', got {!r}".format(
+                value
+            )
+        )
+    return layer, attribute
+
+
+def _oneline_row(address, result, fields):
+    """Flatten the first match of a onelineaddress result into a CSV row"""
+    row = {"address": address, "match": False}
+    if isinstance(result, Exception):
+        print("Error geocoding {}: {}".format(address, result), file=sys.stderr)
+        return row
+    if not result:
+        return row
+
+    match = result[0]
+    row["match"] = True
+    row["lon"], row["lat"] = match["coordinates"]["x"], match["coordinates"]["y"]
+    for layer, attribute in fields:
+        geographies = match.get("geographies", {}).get(layer) or [{}]
+        row["{}:{}".format(layer, attribute)] = geographies[0].get(attribute)
+    return row
+
+
+def _lines(f):
+    """Yield the non-blank lines of a file, stripped"""
+    for line in f:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def _batch_input(f, fieldnames, positions):
+    """Read batch rows from a CSV file as dicts, noting the input position of each id"""
+    for position, row in enumerate(row for row in csv.reader(f) if row):
+        positions[row[0]] = position
+        yield dict(zip(fieldnames, row))
+
+
+async def _input_order(rows, positions, chunksize):
+    """
+    Put the rows of each chunk from addressbatch_iter in input order. Chunks arrive in
+    input order, so a chunk is complete once a row of a later one arrives.
+    """
+    chunk, current = [], 0
+    async for row in rows:
+        position = positions.pop(row["id"], None)
+        if position is not None and position // chunksize > current:
+            for _, done in sorted(chunk, key=lambda item: item[0]):
+                yield done
+            chunk, current = [], position // chunksize
+        # Rows of unknown ids go last in their chunk
+        chunk.append((float("inf") if position is None else position, row))
+    for _, done in sorted(chunk, key=lambda item: item[0]):
+        yield done
+
+
+def _parser():
     parser = argparse.ArgumentParser(
         "async-censusgeocode",
         description="Command-line interface for the Census Geocoding API",
@@ -44,6 +112,40 @@ async def main():
             "The id must be a unique. Read from stdin with -"
         ),
     )
+    parser.add_argument(
+        "--oneline-file",
+        type=str,
+        metavar="FILE",
+        help=(
+            "file of one-line addresses, one per line, geocoded with concurrent requests. "
+            "Read from stdin with -"
+        ),
+    )
+    parser.add_argument(
+        "--field",
+        type=_field,
+        action="append",
+        default=[],
+        dest="fields",
+        metavar="LAYER:ATTRIBUTE",
+        help=(
+            "Geography attribute to add to the output, e.g. 'Census Tracts:GEOID'. Can be repeated. "
+            "Implies --rettype geographies. For use with --oneline-file"
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="JOURNAL",
+        help=(
+            "SQLite file journaling completed batches. If the job is run again with the same "
+            "journal, finished batches are read from it instead of being sent. For use with --csv"
+        ),
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="PATH",
+        help="SQLite file to cache results in, so repeated addresses are not sent again",
+    )
     parser.add_argument(
         "--rettype",
         choices=["locations", "geographies"],
@@ -53,6 +155,34 @@ async def main():
             "latitude and longitude. For use with --csv"
         ),
     )
+    parser.add_argument(
+        "--chunk-size",
+        metavar="ROWS",
+        type=int,
+        default=BATCH_LIMIT,
+        help="Rows per batch request, at most {0} [default: {0}]. For use with --csv".format(
+            BATCH_LIMIT
+        ),
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help=(
+            "Requests in flight at once [default: {} batches with --csv, {} lookups with "
+            "--oneline-file]".format(DEFAULT_BATCH_CONCURRENCY, DEFAULT_CONCURRENCY)
+        ),
+    )
+    parser.add_argument(
+        "--order",
+        choices=["input", "completion"],
+        default="input",
+        help=(
+            "Write rows in input order (with --csv, once each chunk is complete), or "
+            "as soon as they arrive [default: input]. For use with --csv and "
+            "--oneline-file"
+        ),
+    )
     parser.add_argument(
         "--benchmark",
         default=DEFAULT_BENCHMARK,
@@ -70,50 +200,113 @@ async def main():
         default=12,
         help="Request timeout [default: 12]",
     )
+    return parser
 
-    args = parser.parse_args()
-    acg = AsyncCensusGeocode(benchmark=args.benchmark, vintage=args.vintage)
 
-    if args.address:
-        result = await acg.onelineaddress(
-            args.address, returntype=args.rettype, timeout=args.timeout
+async def main(args=None):
+    """Command-line interface for async-censusgeocode"""
+    if args is None:
+        args = _parser().parse_args()
+    cache = SQLiteCache(args.cache) if args.cache else None
+    try:
+        acg = AsyncCensusGeocode(
+            benchmark=args.benchmark, vintage=args.vintage, cache=cache
         )
 
-        try:
-            print(
-                "{},{}".format(
-                    result[0]["coordinates"]["x"], result[0]["coordinates"]["y"]
+        if args.address:
+            async with acg:
+                result = await acg.onelineaddress(
+                    args.address, returntype=args.rettype, timeout=args.timeout
+                )
+
+            try:
+                print(
+                    "{},{}".format(
+                        result[0]["coordinates"]["x"], result[0]["coordinates"]["y"]
+                    )
                 )
+
+            except IndexError:
+                print("Address not found: {}".format(args.address), file=sys.stderr)
+                sys.exit(1)
+
+        elif args.csv:
+            # Input is read a chunk at a time, and rows are written once their chunk
+            # is complete, or as they arrive with --order completion
+            if args.csv == "-":
+                infile = sys.stdin
+            else:
+                infile = open(args.csv, newline="", encoding="utf-8")
+            positions = {}
+
+            fieldnames = acg.batchfields[args.rettype] + ["lat", "lon"]
+            fieldnames.pop(fieldnames.index("coordinate"))
+            writer = csv.DictWriter(
+                sys.stdout, fieldnames=fieldnames, extrasaction="ignore"
             )
+            writer.writeheader()
 
-        except IndexError:
-            print("Address not found: {}".format(args.address), file=sys.stderr)
-            sys.exit(1)
+            rows = acg.addressbatch_iter(
+                _batch_input(infile, acg.batchinput, positions),
+                chunksize=args.chunk_size,
+                concurrency=args.concurrency or DEFAULT_BATCH_CONCURRENCY,
+                ordered=args.order == "input",
+                checkpoint=args.resume,
+                returntype=args.rettype,
+                timeout=args.timeout,
+            )
+            if args.order == "input":
+                rows = _input_order(rows, positions, args.chunk_size)
+            try:
+                async with acg:
+                    async for row in rows:
+                        writer.writerow(row)
+            finally:
+                if infile is not sys.stdin:
+                    infile.close()
+
+        elif args.oneline_file:
+            returntype = "geographies" if args.fields else args.rettype
+            fieldnames = ["address", "match", "lon", "lat"] + [
+                "{}:{}".format(layer, attribute) for layer, attribute in args.fields
+            ]
+            writer = csv.DictWriter(sys.stdout, fieldnames=fieldnames)
+            writer.writeheader()
 
-    elif args.csv:
-        if args.csv == "-":
-            # No streaming here - consume the entirety of stdin.
-            infile = io.StringIO()
-            csv.writer(infile).writerows(csv.reader(sys.stdin))
-            infile.seek(0)
+            # Only close the file if it was opened here, not standard input
+            infile = sys.stdin if args.oneline_file == "-" else open(args.oneline_file)
+            try:
+                async with acg:
+                    async for address, result in acg.geocode_many(
+                        _lines(infile),
+                        concurrency=args.concurrency or DEFAULT_CONCURRENCY,
+                        ordered=args.order == "input",
+                        returntype=returntype,
+                        timeout=args.timeout,
+                    ):
+                        writer.writerow(_oneline_row(address, result, args.fields))
+            finally:
+                if infile is not sys.stdin:
+                    infile.close()
 
         else:
-            infile = args.csv
+            print("Address, csv file or oneline file required", file=sys.stderr)
+            sys.exit(1)
 
-        result = await acg.addressbatch(
-            infile, returntype=args.rettype, timeout=args.timeout
-        )
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def run():
+    """Entry point of the command line tool. Arguments are parsed before asyncio and
+    httpx are imported, so --help and --version return quickly."""
+    args = _parser().parse_args()
 
-        fieldnames = acg.batchfields[args.rettype] + ["lat", "lon"]
-        fieldnames.pop(fieldnames.index("coordinate"))
-        writer = csv.DictWriter(sys.stdout, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(result)
+    import asyncio
 
-    else:
-        print("Address or csv file required", file=sys.stderr)
-        sys.exit(1)
+    asyncio.run(main(args))
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run()
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 """Tests for censusgeocode"""
+
 # This file is part of censusgeocode.
 # https://github.com/fitnr/censusgeocode
 
@@ -8,12 +9,45 @@
 # Copied and heavily modified from censusgeocode, licensed under GPL-3.0.
 # https://github.com/fitnr/censusgeocode
 
+import asyncio
 import pytest
 import warnings
 from unittest.mock import patch, AsyncMock
 import io
+import csv
+import json
+import pickle
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
 
-from async_censusgeocode import AsyncCensusGeocode, AddressResult, GeographyResult
+from async_censusgeocode import (
+    AdaptiveLimiter,
+    AsyncCensusGeocode,
+    AddressResult,
+    BatchJournal,
+    BatchResult,
+    BoundaryIndex,
+    CensusGeocode,
+    GeographyResult,
+    MemoryCache,
+    MetricsCollector,
+    MicroBatch,
+    OpenTelemetryHook,
+    ReplayTransport,
+    RetryPolicy,
+    SQLiteCache,
+    normalize_address,
+    schema_decoder,
+    _LazyModule,
+)
 
 
 @pytest.fixture
@@ -23,26 +57,28 @@ def acg():
 
 @pytest.mark.asyncio
 async def test_returns_geo(acg):
-    with patch("async_censusgeocode.AsyncClient") as mock_client:
-        mock_instance = mock_client.return_value.__aenter__.return_value
+    with patch("async_censusgeocode.httpx.AsyncClient") as mock_client:
+        mock_instance = mock_client.return_value
         mock_instance.get = AsyncMock()
-        # Set .json.return_value directly, not as an AsyncMock
-        mock_instance.get.return_value.json.return_value = {
-            "result": {
-                "input": {"foo": "bar"},
-                "geographies": {
-                    "Census Tracts": [
-                        {
-                            "BASENAME": "615",
-                            "CENTLON": "-74.0",
-                            "CENTLAT": "43.0",
-                            "INTPTLON": "-74.0",
-                            "INTPTLAT": "43.0",
-                        }
-                    ]
-                },
-            }
-        }
+        mock_instance.get.return_value = httpx.Response(
+            200,
+            json={
+                "result": {
+                    "input": {"foo": "bar"},
+                    "geographies": {
+                        "Census Tracts": [
+                            {
+                                "BASENAME": "615",
+                                "CENTLON": "-74.0",
+                                "CENTLAT": "43.0",
+                                "INTPTLON": "-74.0",
+                                "INTPTLAT": "43.0",
+                            }
+                        ]
+                    },
+                }
+            },
+        )
         results = await acg.coordinates(-74, 43, returntype="geographies")
         assert isinstance(results, GeographyResult)
         assert results.input
@@ -50,34 +86,38 @@ async def test_returns_geo(acg):
 
 @pytest.mark.asyncio
 async def test_coords(acg):
-    with patch("async_censusgeocode.AsyncClient") as mock_client:
-        mock_instance = mock_client.return_value.__aenter__.return_value
+    with patch("async_censusgeocode.httpx.AsyncClient") as mock_client:
+        mock_instance = mock_client.return_value
         mock_instance.get = AsyncMock()
-        mock_instance.get.return_value.json.return_value = {
-            "result": {
-                "geographies": {
-                    "Counties": [
-                        {
-                            "BASENAME": "Saratoga",
-                            "GEOID": "36091",
-                            "CENTLON": "-74.0",
-                            "CENTLAT": "43.0",
-                            "INTPTLON": "-74.0",
-                            "INTPTLAT": "43.0",
-                        }
-                    ],
-                    "Census Tracts": [
-                        {
-                            "BASENAME": "615",
-                            "CENTLON": "-74.0",
-                            "CENTLAT": "43.0",
-                            "INTPTLON": "-74.0",
-                            "INTPTLAT": "43.0",
-                        }
-                    ],
+        mock_instance.get.return_value = httpx.Response(
+            200,
+            json={
+                "result": {
+                    "input": {"location": {"x": -74.0, "y": 43.0}},
+                    "geographies": {
+                        "Counties": [
+                            {
+                                "BASENAME": "Saratoga",
+                                "GEOID": "36091",
+                                "CENTLON": "-74.0",
+                                "CENTLAT": "43.0",
+                                "INTPTLON": "-74.0",
+                                "INTPTLAT": "43.0",
+                            }
+                        ],
+                        "Census Tracts": [
+                            {
+                                "BASENAME": "615",
+                                "CENTLON": "-74.0",
+                                "CENTLAT": "43.0",
+                                "INTPTLON": "-74.0",
+                                "INTPTLAT": "43.0",
+                            }
+                        ],
+                    },
                 }
-            }
-        }
+            },
+        )
         results = await acg.coordinates(-74, 43)
         assert isinstance(results, GeographyResult)
         assert results.input
@@ -91,24 +131,28 @@ async def test_url(acg):
 
 @pytest.mark.asyncio
 async def test_address_zipcode(acg):
-    with patch("async_censusgeocode.AsyncClient") as mock_client:
-        mock_instance = mock_client.return_value.__aenter__.return_value
+    with patch("async_censusgeocode.httpx.AsyncClient") as mock_client:
+        mock_instance = mock_client.return_value
         mock_instance.get = AsyncMock()
-        mock_instance.get.return_value.json.return_value = {
-            "result": {
-                "geographies": {
-                    "Counties": [
-                        {
-                            "BASENAME": "District of Columbia",
-                            "CENTLON": "-77.0365",
-                            "CENTLAT": "38.8977",
-                            "INTPTLON": "-77.0365",
-                            "INTPTLAT": "38.8977",
-                        }
-                    ]
+        mock_instance.get.return_value = httpx.Response(
+            200,
+            json={
+                "result": {
+                    "input": {"address": {"street": "1600 Pennsylvania Avenue NW"}},
+                    "geographies": {
+                        "Counties": [
+                            {
+                                "BASENAME": "District of Columbia",
+                                "CENTLON": "-77.0365",
+                                "CENTLAT": "38.8977",
+                                "INTPTLON": "-77.0365",
+                                "INTPTLAT": "38.8977",
+                            }
+                        ]
+                    },
                 }
-            }
-        }
+            },
+        )
         results = await acg.address(
             "1600 Pennsylvania Avenue NW",
             city="Washington",
@@ -121,24 +165,28 @@ async def test_address_zipcode(acg):
 
 @pytest.mark.asyncio
 async def test_address_zip(acg):
-    with patch("async_censusgeocode.AsyncClient") as mock_client:
-        mock_instance = mock_client.return_value.__aenter__.return_value
+    with patch("async_censusgeocode.httpx.AsyncClient") as mock_client:
+        mock_instance = mock_client.return_value
         mock_instance.get = AsyncMock()
-        mock_instance.get.return_value.json.return_value = {
-            "result": {
-                "geographies": {
-                    "Counties": [
-                        {
-                            "BASENAME": "District of Columbia",
-                            "CENTLON": "-77.0365",
-                            "CENTLAT": "38.8977",
-                            "INTPTLON": "-77.0365",
-                            "INTPTLAT": "38.8977",
-                        }
-                    ]
+        mock_instance.get.return_value = httpx.Response(
+            200,
+            json={
+                "result": {
+                    "input": {"address": {"street": "1600 Pennsylvania Avenue NW"}},
+                    "geographies": {
+                        "Counties": [
+                            {
+                                "BASENAME": "District of Columbia",
+                                "CENTLON": "-77.0365",
+                                "CENTLAT": "38.8977",
+                                "INTPTLON": "-77.0365",
+                                "INTPTLAT": "38.8977",
+                            }
+                        ]
+                    },
                 }
-            }
-        }
+            },
+        )
         results = await acg.address(
             "1600 Pennsylvania Avenue NW", city="Washington", state="DC", zip="20500"
         )
@@ -148,40 +196,43 @@ async def test_address_zip(acg):
 
 @pytest.mark.asyncio
 async def test_onelineaddress(acg):
-    with patch("async_censusgeocode.AsyncClient") as mock_client:
-        mock_instance = mock_client.return_value.__aenter__.return_value
+    with patch("async_censusgeocode.httpx.AsyncClient") as mock_client:
+        mock_instance = mock_client.return_value
         mock_instance.get = AsyncMock()
-        mock_instance.get.return_value.json.return_value = {
-            "result": {
-                "geographies": {
-                    "Counties": [
-                        {
-                            "BASENAME": "District of Columbia",
-                            "CENTLON": "-77.0365",
-                            "CENTLAT": "38.8977",
-                            "INTPTLON": "-77.0365",
-                            "INTPTLAT": "38.8977",
-                        }
-                    ],
-                },
-                "Metropolitan Divisions": [
-                    {
-                        "CENTLON": "-77.0",
-                        "CENTLAT": "38.9",
-                        "INTPTLON": "-77.0",
-                        "INTPTLAT": "38.9",
-                    }
-                ],
-                "Alaska Native Village Statistical Areas": [
-                    {
-                        "CENTLON": "-150.0",
-                        "CENTLAT": "60.0",
-                        "INTPTLON": "-150.0",
-                        "INTPTLAT": "60.0",
-                    }
-                ],
-            }
-        }
+        mock_instance.get.return_value = httpx.Response(
+            200,
+            json={
+                "result": {
+                    "geographies": {
+                        "Counties": [
+                            {
+                                "BASENAME": "District of Columbia",
+                                "CENTLON": "-77.0365",
+                                "CENTLAT": "38.8977",
+                                "INTPTLON": "-77.0365",
+                                "INTPTLAT": "38.8977",
+                            }
+                        ],
+                        "Metropolitan Divisions": [
+                            {
+                                "CENTLON": "-77.0",
+                                "CENTLAT": "38.9",
+                                "INTPTLON": "-77.0",
+                                "INTPTLAT": "38.9",
+                            }
+                        ],
+                        "Alaska Native Village Statistical Areas": [
+                            {
+                                "CENTLON": "-150.0",
+                                "CENTLAT": "60.0",
+                                "INTPTLON": "-150.0",
+                                "INTPTLAT": "60.0",
+                            }
+                        ],
+                    },
+                }
+            },
+        )
         results = await acg.onelineaddress(
             "1600 Pennsylvania Avenue NW, Washington, DC, 20500", layers="all"
         )
@@ -193,19 +244,22 @@ async def test_onelineaddress(acg):
 
 @pytest.mark.asyncio
 async def test_address_return_type(acg):
-    with patch("async_censusgeocode.AsyncClient") as mock_client:
-        mock_instance = mock_client.return_value.__aenter__.return_value
+    with patch("async_censusgeocode.httpx.AsyncClient") as mock_client:
+        mock_instance = mock_client.return_value
         mock_instance.get = AsyncMock()
-        mock_instance.get.return_value.json.return_value = {
-            "result": {
-                "addressMatches": [
-                    {
-                        "matchedAddress": "1600 PENNSYLVANIA AVE NW, WASHINGTON, DC, 20502",
-                        "addressComponents": {"streetName": "PENNSYLVANIA"},
-                    }
-                ]
-            }
-        }
+        mock_instance.get.return_value = httpx.Response(
+            200,
+            json={
+                "result": {
+                    "addressMatches": [
+                        {
+                            "matchedAddress": "1600 PENNSYLVANIA AVE NW, WASHINGTON, DC, 20502",
+                            "addressComponents": {"streetName": "PENNSYLVANIA"},
+                        }
+                    ]
+                }
+            },
+        )
         results = await acg.address(
             "1600 Pennsylvania Avenue NW",
             city="Washington",
@@ -222,29 +276,32 @@ async def test_address_return_type(acg):
 
 @pytest.mark.asyncio
 async def test_benchmark_vintage(acg):
-    with patch("async_censusgeocode.AsyncClient") as mock_client:
+    with patch("async_censusgeocode.httpx.AsyncClient") as mock_client:
         bmark, vint = "Public_AR_Census2020", "Census2020_Current"
-        mock_instance = mock_client.return_value.__aenter__.return_value
+        mock_instance = mock_client.return_value
         mock_instance.get = AsyncMock()
-        mock_instance.get.return_value.json.return_value = {
-            "result": {
-                "input": {
-                    "benchmark": {"benchmarkName": bmark},
-                    "vintage": {"vintageName": vint},
-                },
-                "geographies": {
-                    "Census Tracts": [
-                        {
-                            "GEOID": "11001006202",
-                            "CENTLON": "-77.0365",
-                            "CENTLAT": "38.8977",
-                            "INTPTLON": "-77.0365",
-                            "INTPTLAT": "38.8977",
-                        }
-                    ]
-                },
-            }
-        }
+        mock_instance.get.return_value = httpx.Response(
+            200,
+            json={
+                "result": {
+                    "input": {
+                        "benchmark": {"benchmarkName": bmark},
+                        "vintage": {"vintageName": vint},
+                    },
+                    "geographies": {
+                        "Census Tracts": [
+                            {
+                                "GEOID": "11001006202",
+                                "CENTLON": "-77.0365",
+                                "CENTLAT": "38.8977",
+                                "INTPTLON": "-77.0365",
+                                "INTPTLAT": "38.8977",
+                            }
+                        ]
+                    },
+                }
+            },
+        )
         acg = AsyncCensusGeocode(benchmark=bmark, vintage=vint)
         result = await acg.address(
             "1600 Pennsylvania Avenue NW",
@@ -263,16 +320,19 @@ async def test_benchmark_vintage(acg):
 async def test_addressbatch(acg):
     with (
         patch("builtins.open", create=True) as mock_open,
-        patch("async_censusgeocode.AsyncClient") as mock_client,
+        patch("async_censusgeocode.httpx.AsyncClient") as mock_client,
     ):
         mock_open.side_effect = lambda *a, **kw: io.BytesIO(b"test csv")
-        mock_instance = mock_client.return_value.__aenter__.return_value
+        mock_instance = mock_client.return_value
         mock_instance.post = AsyncMock()
         # Use the same CSV columns for both batch calls
-        mock_instance.post.return_value.text = (
-            "id,address,match,tigerlineid,statefp,coordinate\n"
-            '3,"3 GRAMERCY PARK W, NEW YORK, NY, 10003",Match,59653655,36,"-73.9857,40.7372"\n'
-            "2,,,No Match,,,\n"
+        mock_instance.post.return_value = httpx.Response(
+            200,
+            text=(
+                "id,address,match,tigerlineid,statefp,coordinate\n"
+                '3,"3 GRAMERCY PARK W, NEW YORK, NY, 10003",Match,59653655,36,"-73.9857,40.7372"\n'
+                "2,,,No Match,,,\n"
+            ),
         )
         result = await acg.addressbatch(
             "tests/fixtures/batch.csv", returntype="locations"
@@ -283,10 +343,13 @@ async def test_addressbatch(acg):
         assert resultdict[2]["match"] is False
 
         # Use the same CSV columns for geographies
-        mock_instance.post.return_value.text = (
-            "id,address,match,matchtype,parsed,coordinate,tigerlineid,side,statefp,countyfp,tract,block\n"
-            '3,,,,,"-73.9857,40.7372",59653655,,36,,,,\n'
-            "2,,,,,,,,,,,,\n"
+        mock_instance.post.return_value = httpx.Response(
+            200,
+            text=(
+                "id,address,match,matchtype,parsed,coordinate,tigerlineid,side,statefp,countyfp,tract,block\n"
+                '3,,,,,"-73.9857,40.7372",59653655,,36,,,,\n'
+                "2,,,,,,,,,,,,\n"
+            ),
         )
         result = await acg.addressbatch(
             "tests/fixtures/batch.csv", returntype="geographies"
@@ -300,14 +363,63 @@ async def test_addressbatch(acg):
 
 @pytest.mark.asyncio
 async def test_warning10k(acg):
-    warnings.simplefilter("error")
     data = ({} for _ in range(10001))
-    with pytest.raises(
-        UserWarning,
-        match="Sending more than 10,000 records, the upper limit for the Census Geocoder. Request will likely fail",
-    ):
-        result = await acg.addressbatch(data)
-        assert result == []
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        with pytest.raises(
+            UserWarning,
+            match="Sending more than 10,000 records, the upper limit for the Census Geocoder. Request will likely fail",
+        ):
+            await acg._post_batch(data=data)
+
+
+def _echo_batch(sent):
+    """Fake _post_batch returning one reversed result row per uploaded row."""
+
+    async def post_batch(f=None, **kwargs):
+        rows = list(csv.reader(io.TextIOWrapper(f, encoding="utf-8")))
+        sent.append(rows)
+        return [{"id": row[0], "match": True} for row in reversed(rows)]
+
+    return post_batch
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_chunks(acg):
+    sent = []
+    data = [{"street": "{} Main St".format(i)} for i in range(25)]
+    with patch.object(acg, "_post_batch", side_effect=_echo_batch(sent)):
+        result = await acg.addressbatch(data, chunksize=10, concurrency=2)
+    assert [len(rows) for rows in sent] == [10, 10, 5]
+    assert [r["id"] for r in result] == [str(i) for i in range(1, 26)]
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_over_10k_is_split(acg):
+    sent = []
+    data = ({} for _ in range(10001))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        with patch.object(acg, "_post_batch", side_effect=_echo_batch(sent)):
+            result = await acg.addressbatch(data)
+    assert [len(rows) for rows in sent] == [10000, 1]
+    assert len(result) == 10001
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_chunk_failure(acg):
+    async def post_batch(f=None, **kwargs):
+        raise httpx.ConnectError("boom")
+
+    with patch.object(acg, "_post_batch", side_effect=post_batch):
+        with pytest.raises(httpx.ConnectError):
+            await acg.addressbatch("tests/fixtures/batch.csv", chunksize=1)
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_chunksize_limit(acg):
+    with pytest.raises(ValueError):
+        await acg.addressbatch([], chunksize=10001)
 
 
 @pytest.mark.asyncio
@@ -330,3 +442,1409 @@ async def test_address_returns_addressresult():
         result = await client.address("123 Main St", city="Anytown", state="NY")
         assert isinstance(result, AddressResult)
         assert result[0]["matchedAddress"] == "foo"
+
+
+def _json_transport(payload, seen=None):
+    """MockTransport answering every request with ``payload``."""
+
+    def handler(request):
+        if seen is not None:
+            seen.append(request)
+        return httpx.Response(200, json=payload)
+
+    return httpx.MockTransport(handler)
+
+
+ADDRESS_PAYLOAD = {
+    "result": {
+        "addressMatches": [{"matchedAddress": "foo", "coordinates": {"x": 1, "y": 2}}]
+    }
+}
+
+
+@pytest.mark.asyncio
+async def test_client_reused_across_requests():
+    seen = []
+    async with AsyncCensusGeocode(
+        transport=_json_transport(ADDRESS_PAYLOAD, seen)
+    ) as acg:
+        client = acg._get_client()
+        await acg.onelineaddress("4600 Silver Hill Rd, Suitland, MD 20746")
+        await acg.address("4600 Silver Hill Rd", city="Suitland", state="MD")
+        assert acg._get_client() is client
+        assert not client.is_closed
+    assert client.is_closed
+    assert len(seen) == 2
+    assert seen[0].url.params["benchmark"] == "Public_AR_Current"
+
+
+@pytest.mark.asyncio
+async def test_aclose_leaves_injected_client_open():
+    client = httpx.AsyncClient(transport=_json_transport(ADDRESS_PAYLOAD))
+    acg = AsyncCensusGeocode(client=client)
+    result = await acg.onelineaddress("4600 Silver Hill Rd, Suitland, MD 20746")
+    assert isinstance(result, AddressResult)
+    await acg.aclose()
+    assert not client.is_closed
+    await client.aclose()
+
+
+def test_client_recreated_per_event_loop():
+    import asyncio
+
+    acg = AsyncCensusGeocode(transport=_json_transport(ADDRESS_PAYLOAD))
+
+    async def get_client():
+        return acg._get_client()
+
+    first = asyncio.run(get_client())
+    second = asyncio.run(get_client())
+    assert first is not second
+
+
+def _batch_transport(uploads=None):
+    """MockTransport answering addressbatch uploads with one matched row per id."""
+
+    def handler(request):
+        body = request.read().decode()
+        ids = re.findall(r"^([^,\r\n]+),", body, flags=re.MULTILINE)
+        if uploads is not None:
+            uploads.append(ids)
+        lines = (
+            '{0},"{0} MAIN ST",Match,Exact,"{0} MAIN ST","-73.9,40.7",1,L\n'.format(i)
+            for i in reversed(ids)
+        )
+        return httpx.Response(200, text="".join(lines))
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_iter():
+    uploads = []
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 8)]
+    async with AsyncCensusGeocode(transport=_batch_transport(uploads)) as acg:
+        rows = [
+            row
+            async for row in acg.addressbatch_iter(
+                data, chunksize=3, concurrency=2, returntype="locations"
+            )
+        ]
+    assert uploads == [["1", "2", "3"], ["4", "5", "6"], ["7"]]
+    # chunks in input order, rows as returned within each chunk
+    assert [r["id"] for r in rows] == ["3", "2", "1", "6", "5", "4", "7"]
+    assert rows[0]["match"] is True
+    assert rows[0]["lon"] == -73.9 and rows[0]["lat"] == 40.7
+    assert "coordinate" not in rows[0]
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_iter_stops_early():
+    uploads = []
+    data = ({"street": "{} Main St".format(i)} for i in range(1, 101))
+    async with AsyncCensusGeocode(transport=_batch_transport(uploads)) as acg:
+        stream = acg.addressbatch_iter(
+            data, chunksize=10, concurrency=2, returntype="locations"
+        )
+        async for row in stream:
+            break
+        await stream.aclose()
+    assert row["id"] == "10"
+    assert len(uploads) <= 3
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_upload(acg):
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 6)]
+    async with AsyncCensusGeocode(transport=_batch_transport()) as acg:
+        result = await acg.addressbatch(data, chunksize=2, returntype="locations")
+    assert [r["id"] for r in result] == ["1", "2", "3", "4", "5"]
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_request():
+    seen = []
+    cache = MemoryCache(maxsize=10)
+    transport = _json_transport(ADDRESS_PAYLOAD, seen)
+    async with AsyncCensusGeocode(transport=transport, cache=cache) as acg:
+        first = await acg.onelineaddress("4600 Silver Hill Rd, Suitland, MD")
+        second = await acg.onelineaddress("  4600 silver hill rd,   Suitland, MD ")
+        other = await acg.onelineaddress(
+            "4600 Silver Hill Rd, Suitland, MD", returntype="locations"
+        )
+    assert second is first
+    assert other is not first
+    assert len(seen) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_memory_cache_lru_eviction():
+    cache = MemoryCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_memory_cache_ttl():
+    cache = MemoryCache(ttl=10)
+    with patch("async_censusgeocode.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("async_censusgeocode.time.monotonic", return_value=105.0):
+        assert cache.get("a") == 1
+    with patch("async_censusgeocode.time.monotonic", return_value=110.0):
+        assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_sqlite_cache_persists(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    seen = []
+    transport = _json_transport(ADDRESS_PAYLOAD, seen)
+    async with AsyncCensusGeocode(transport=transport, cache=SQLiteCache(path)) as acg:
+        await acg.onelineaddress("4600 Silver Hill Rd, Suitland, MD")
+        acg.cache.close()
+
+    # a second process opening the same file starts warm
+    cache = SQLiteCache(path)
+    async with AsyncCensusGeocode(transport=transport, cache=cache) as acg:
+        result = await acg.onelineaddress("4600 Silver Hill Rd, Suitland, MD")
+    assert len(seen) == 1
+    assert isinstance(result, AddressResult)
+    assert result[0]["matchedAddress"] == "foo"
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert cache._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    cache.close()
+
+
+def test_sqlite_cache_ttl(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), ttl=10)
+    with patch("async_censusgeocode.time.time", return_value=100.0):
+        cache.set(("a",), {"match": True})
+    with patch("async_censusgeocode.time.time", return_value=105.0):
+        assert cache.get(("a",)) == {"match": True}
+    with patch("async_censusgeocode.time.time", return_value=110.0):
+        assert cache.get(("a",)) is None
+    cache.close()
+
+
+def test_sqlite_cache_busy(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = SQLiteCache(path, timeout=0.01)
+    cache.set(("a",), {"match": True})
+
+    # Another process holding the write lock drops writes, and reads go on
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    started = time.perf_counter()
+    cache.set(("b",), {"match": True})
+    assert time.perf_counter() - started < 1
+    assert cache.get(("a",)) == {"match": True}
+    other.execute("ROLLBACK")
+    other.close()
+
+    assert cache.get(("b",)) is None
+    cache.set(("b",), {"match": True})
+    assert cache.get(("b",)) == {"match": True}
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_sends_only_cache_misses(tmp_path):
+    uploads = []
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    transport = _batch_transport(uploads)
+    first = [{"id": i, "street": "{} Main St".format(i)} for i in range(1, 4)]
+    second = [
+        {"id": "a", "street": "1 MAIN ST"},
+        {"id": "b", "street": "9 Main St"},
+        {"id": "c", "street": "3 main  st"},
+    ]
+    async with AsyncCensusGeocode(transport=transport, cache=cache) as acg:
+        await acg.addressbatch(first, returntype="locations")
+        result = await acg.addressbatch(second, returntype="locations")
+        streamed = [
+            row async for row in acg.addressbatch_iter(second, returntype="locations")
+        ]
+    assert uploads == [["1", "2", "3"], ["b"]]
+    assert [r["id"] for r in result] == ["a", "b", "c"]
+    assert result[0]["address"] == "1 MAIN ST"
+    assert result[1]["address"] == "b MAIN ST"
+    assert sorted(r["id"] for r in streamed) == ["a", "b", "c"]
+    cache.close()
+
+
+def test_normalize_address():
+    assert normalize_address(
+        "79 Wistful Vista Street.", "peoria", "Illinois", "61604-1234"
+    ) == ("79 WISTFUL VISTA ST", "PEORIA", "IL", "61604")
+    assert normalize_address("  4600 silver hill road, ", "Suitland", "md", 20746) == (
+        "4600 SILVER HILL RD",
+        "SUITLAND",
+        "MD",
+        "20746",
+    )
+    assert normalize_address("12-34 N. 31st St #2") == ("12-34 N 31ST ST 2", "", "", "")
+    # only the suffix and directionals around the name are abbreviated
+    assert normalize_address("12 Court Street")[0] == "12 COURT ST"
+    assert normalize_address("1 West Drive")[0] == "1 WEST DR"
+    assert normalize_address("9 North Main Street West Suite 4")[0] == (
+        "9 N MAIN ST W STE 4"
+    )
+
+
+DUPLICATED = [
+    {"id": "a", "street": "1 Main Street", "city": "Peoria", "state": "IL"},
+    {"id": "b", "street": "2 Main St", "city": "Peoria", "state": "IL"},
+    {"id": "c", "street": "1 MAIN ST.", "city": "peoria", "state": "Illinois"},
+    {"id": "d", "street": "3 Main St", "city": "Peoria", "state": "IL"},
+    {"id": "e", "street": "1 main  st", "city": "PEORIA", "state": "il"},
+]
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_dedupe():
+    uploads, bodies = [], []
+    handler = _batch_transport(uploads).handler
+
+    def record(request):
+        bodies.append(request.read().decode())
+        return handler(request)
+
+    async with AsyncCensusGeocode(transport=httpx.MockTransport(record)) as acg:
+        result = await acg.addressbatch(
+            DUPLICATED, chunksize=2, dedupe=True, returntype="locations"
+        )
+    # chunks hold up to two distinct addresses, duplicates are collapsed per chunk
+    assert uploads == [["a", "b"], ["d", "e"]]
+    # the first row of each address is uploaded as given, not normalized
+    assert "a,1 Main Street,Peoria,IL" in bodies[0]
+    assert [r["id"] for r in result] == ["a", "b", "c", "d", "e"]
+    assert result[2]["address"] == result[0]["address"] == "a MAIN ST"
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_iter_dedupe():
+    uploads = []
+    async with AsyncCensusGeocode(transport=_batch_transport(uploads)) as acg:
+        rows = [
+            row
+            async for row in acg.addressbatch_iter(
+                DUPLICATED, dedupe=True, returntype="locations"
+            )
+        ]
+    assert uploads == [["a", "b", "d"]]
+    assert sorted(r["id"] for r in rows) == ["a", "b", "c", "d", "e"]
+    assert {r["address"] for r in rows if r["id"] in "ace"} == {"a MAIN ST"}
+
+
+@pytest.mark.asyncio
+async def test_limiter_caps_concurrency():
+    limiter = AdaptiveLimiter(initial=2, max_limit=2)
+    running, peak = 0, 0
+
+    async def request():
+        nonlocal running, peak
+        started = await limiter.acquire()
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        limiter.release(started, "onelineaddress", True)
+
+    await asyncio.gather(*(request() for _ in range(10)))
+    assert peak == 2
+    assert limiter.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_aimd():
+    # latency checks are out of scope here, only the AIMD steps
+    limiter = AdaptiveLimiter(initial=4, max_limit=5, min_limit=2, tolerance=1e9)
+    for _ in range(4):
+        limiter.release(await limiter.acquire(), "address", True)
+    assert limiter.limit == 5
+
+    started = [await limiter.acquire() for _ in range(3)]
+    for t in started:
+        limiter.release(t, "address", False)
+    # one cut per congestion episode
+    assert limiter.limit == 2.5
+
+    limiter.release(await limiter.acquire(), "address", False)
+    assert limiter.limit == 2
+
+
+@pytest.mark.asyncio
+async def test_limiter_rate():
+    limiter = AdaptiveLimiter(initial=10, rate=100)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for _ in range(5):
+        limiter.release(await limiter.acquire(), "coordinates", True)
+    assert loop.time() - start >= 0.035
+
+
+@pytest.mark.asyncio
+async def test_limiter_backs_off_on_server_errors():
+    limiter = AdaptiveLimiter(initial=8)
+    transport = httpx.MockTransport(lambda request: httpx.Response(503))
+    async with AsyncCensusGeocode(transport=transport, limiter=limiter) as acg:
+        with pytest.raises(httpx.HTTPStatusError):
+            await acg.onelineaddress("4600 Silver Hill Rd, Suitland, MD")
+    assert limiter.limit == 4
+    assert limiter.inflight == 0
+
+
+def _flaky(handler, failures):
+    """Wrap a MockTransport handler so its first calls fail with the given errors."""
+    failures = list(failures)
+
+    def flaky(request):
+        if failures:
+            failure = failures.pop(0)
+            if isinstance(failure, int):
+                return httpx.Response(failure)
+            raise failure
+        return handler(request)
+
+    return flaky
+
+
+@pytest.mark.asyncio
+async def test_retry_single_lookup():
+    seen = []
+    retry = RetryPolicy(attempts=3, backoff=0)
+    handler = _flaky(
+        lambda request: seen.append(request)
+        or httpx.Response(200, json=ADDRESS_PAYLOAD),
+        [503, httpx.ReadTimeout("slow")],
+    )
+    async with AsyncCensusGeocode(
+        transport=httpx.MockTransport(handler), retry=retry
+    ) as acg:
+        result = await acg.onelineaddress("4600 Silver Hill Rd, Suitland, MD")
+    assert isinstance(result, AddressResult)
+    assert retry.retries == 2
+    assert len(seen) == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_gives_up():
+    seen = []
+    retry = RetryPolicy(attempts=5, backoff=0, budget=1)
+    transport = httpx.MockTransport(
+        lambda request: seen.append(request) or httpx.Response(502)
+    )
+    async with AsyncCensusGeocode(transport=transport, retry=retry) as acg:
+        with pytest.raises(httpx.HTTPStatusError):
+            await acg.onelineaddress("4600 Silver Hill Rd, Suitland, MD")
+    assert retry.retries == 1
+    assert len(seen) == 2
+
+
+def test_retry_policy_backoff():
+    retry = RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+    assert [retry.delay(n) for n in range(1, 5)] == [1, 2, 4, 5]
+    assert retry.retryable(httpx.ReadTimeout("slow"))
+    assert not retry.retryable(ValueError())
+
+
+@pytest.mark.asyncio
+async def test_retry_failed_chunk_only():
+    uploads = []
+    handler = _batch_transport(uploads).handler
+    failed = []
+
+    def flaky(request):
+        body = request.read().decode()
+        if "3,3 Main St" in body and not failed:
+            failed.append(body)
+            return httpx.Response(503, request=request)
+        return handler(request)
+
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 5)]
+    async with AsyncCensusGeocode(
+        transport=httpx.MockTransport(flaky), retry=RetryPolicy(backoff=0)
+    ) as acg:
+        result = await acg.addressbatch(data, chunksize=2, returntype="locations")
+    assert [r["id"] for r in result] == ["1", "2", "3", "4"]
+    assert uploads == [["1", "2"], ["3", "4"]]
+    assert len(failed) == 1
+
+
+def _dropping_transport(uploads):
+    """Batch transport that leaves the last row out of its first response."""
+    handler = _batch_transport(uploads).handler
+
+    def dropping(request):
+        response = handler(request)
+        if len(uploads) == 1:
+            return httpx.Response(200, text=response.text.split("\n", 1)[1])
+        return response
+
+    return httpx.MockTransport(dropping)
+
+
+@pytest.mark.asyncio
+async def test_retry_missing_batch_rows():
+    uploads = []
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 4)]
+    async with AsyncCensusGeocode(
+        transport=_dropping_transport(uploads), retry=RetryPolicy(backoff=0)
+    ) as acg:
+        result = await acg.addressbatch(data, returntype="locations")
+    assert uploads == [["1", "2", "3"], ["3"]]
+    assert [r["id"] for r in result] == ["1", "2", "3"]
+
+
+@pytest.mark.asyncio
+async def test_retry_missing_streamed_rows():
+    uploads = []
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 4)]
+    async with AsyncCensusGeocode(
+        transport=_dropping_transport(uploads), retry=RetryPolicy(backoff=0)
+    ) as acg:
+        rows = [
+            row async for row in acg.addressbatch_iter(data, returntype="locations")
+        ]
+    assert uploads == [["1", "2", "3"], ["3"]]
+    assert sorted(r["id"] for r in rows) == ["1", "2", "3"]
+
+
+def _oneline_transport(seen=None, status=200):
+    """MockTransport echoing the one-line address, failing for addresses with "bad"
+    and answering late for addresses starting with "slow". Requests are appended to
+    seen, if given, and answered with status."""
+
+    async def handler(request):
+        if seen is not None:
+            seen.append(request)
+        address = request.url.params.get("address", "")
+        await asyncio.sleep(0.05 if address.startswith("slow") else 0)
+        if "bad" in address:
+            return httpx.Response(400, text="bad address")
+        return httpx.Response(
+            status,
+            json={"result": {"addressMatches": [{"matchedAddress": address}]}},
+        )
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_geocode_many_ordered():
+    async def addresses():
+        for address in ["slow 1", "2", "bad 3", "4"]:
+            yield address
+
+    async with AsyncCensusGeocode(transport=_oneline_transport()) as acg:
+        pairs = [pair async for pair in acg.geocode_many(addresses(), concurrency=2)]
+    assert [address for address, _ in pairs] == ["slow 1", "2", "bad 3", "4"]
+    assert pairs[0][1][0]["matchedAddress"] == "slow 1"
+    assert isinstance(pairs[2][1], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_geocode_many_as_completed():
+    async with AsyncCensusGeocode(transport=_oneline_transport()) as acg:
+        pairs = [
+            pair
+            async for pair in acg.geocode_many(
+                ["slow 1", "2", "3"], concurrency=3, ordered=False
+            )
+        ]
+    assert [address for address, _ in pairs][-1] == "slow 1"
+
+
+@pytest.mark.asyncio
+async def test_coordinates_many():
+    seen = []
+    payload = {"result": {"geographies": {"States": []}}}
+    async with AsyncCensusGeocode(transport=_json_transport(payload, seen)) as acg:
+        pairs = [
+            pair
+            async for pair in acg.coordinates_many(
+                [(-74, 43), (-77, 38.9)], concurrency=1
+            )
+        ]
+    assert [point for point, _ in pairs] == [(-74, 43), (-77, 38.9)]
+    assert all(isinstance(result, GeographyResult) for _, result in pairs)
+    assert [r.url.params["x"] for r in seen] == ["-74", "-77"]
+
+
+def _square(x0, y0, size):
+    return [
+        [x0, y0],
+        [x0 + size, y0],
+        [x0 + size, y0 + size],
+        [x0, y0 + size],
+        [x0, y0],
+    ]
+
+
+@pytest.fixture
+def tracts(tmp_path):
+    """Two adjoining 1x1 tracts, the first with a hole."""
+    features = [
+        {
+            "type": "Feature",
+            "properties": {
+                "STATEFP20": "11",
+                "COUNTYFP20": "001",
+                "TRACTCE20": "006202",
+                "GEOID20": "11001006202",
+                "INTPTLAT20": "+38.5000000",
+                "INTPTLON20": "-077.5000000",
+            },
+            "geometry": {
+                "type": "Polygon",
+                # holes wind clockwise
+                "coordinates": [_square(-78, 38, 1), _square(-77.8, 38.2, 0.2)[::-1]],
+            },
+        },
+        {
+            "type": "Feature",
+            "properties": {"STATE": "11", "COUNTY": "001", "TRACT": "006300"},
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": [[_square(-77, 38, 1)]],
+            },
+        },
+    ]
+    path = tmp_path / "tracts.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    index = BoundaryIndex()
+    index.load("Census Tracts", path)
+    return index
+
+
+def test_boundary_index_lookup(tracts):
+    result = tracts.coordinates(-77.5, 38.5)
+    assert isinstance(result, GeographyResult)
+    tract = result["Census Tracts"][0]
+    assert tract["GEOID"] == "11001006202"
+    assert (tract["STATE"], tract["COUNTY"], tract["TRACT"]) == ("11", "001", "006202")
+    assert tract["INTPT"] == (-77.5, 38.5)
+    # the centroid moves away from the hole
+    assert tract["CENT"] == pytest.approx((-77.4916667, 38.5083333))
+
+    other = tracts.coordinates(-76.5, 38.5)["Census Tracts"][0]
+    assert other["TRACT"] == "006300"
+    assert other["CENT"] == pytest.approx((-76.5, 38.5))
+
+    # in the hole, outside every tract, or asking for a layer that isn't loaded
+    assert tracts.coordinates(-77.7, 38.3) is None
+    assert tracts.coordinates(-80, 38.5) is None
+    assert tracts.coordinates(-77.5, 38.5, layers="Counties") is None
+
+
+def test_boundary_index_many(tracts):
+    pytest.importorskip("numpy")
+    xs = [-77.5, -76.5, -77.7, -80]
+    ys = [38.5, 38.5, 38.3, 38.5]
+    results = tracts.coordinates_many(xs, ys)
+    assert [r and r["Census Tracts"][0]["TRACT"] for r in results] == [
+        "006202",
+        "006300",
+        None,
+        None,
+    ]
+
+
+def test_boundary_index_shapefile(tmp_path):
+    shapefile = pytest.importorskip("shapefile")
+    with shapefile.Writer(str(tmp_path / "counties"), shapeType=shapefile.POLYGON) as w:
+        w.field("STATEFP", "C", size=2)
+        w.field("COUNTYFP", "C", size=3)
+        w.field("GEOID", "C", size=5)
+        w.poly([_square(-78, 38, 2)])
+        w.record("11", "001", "11001")
+    index = BoundaryIndex()
+    index.load("Counties", str(tmp_path / "counties.shp"))
+    county = index.coordinates(-77, 39)["Counties"][0]
+    assert (county["STATE"], county["COUNTY"], county["GEOID"]) == (
+        "11",
+        "001",
+        "11001",
+    )
+
+
+@pytest.mark.asyncio
+async def test_coordinates_uses_boundaries(tracts):
+    seen = []
+    payload = {"result": {"geographies": {"Census Tracts": []}}}
+    transport = _json_transport(payload, seen)
+    async with AsyncCensusGeocode(transport=transport, boundaries=tracts) as acg:
+        local = await acg.coordinates(-77.5, 38.5)
+        remote = await acg.coordinates(-80, 38.5)
+    assert local["Census Tracts"][0]["TRACT"] == "006202"
+    assert remote["Census Tracts"] == []
+    assert len(seen) == 1
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_compact():
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 6)]
+    async with AsyncCensusGeocode(transport=_batch_transport()) as acg:
+        rows = await acg.addressbatch(data, chunksize=2, returntype="locations")
+        result = await acg.addressbatch(
+            data, chunksize=2, returntype="locations", compact=True
+        )
+    assert isinstance(result, BatchResult)
+    assert len(result) == 5
+    assert result == rows
+    assert result[0] == rows[0]
+    assert result[-1]["id"] == "5"
+    assert result[0]["match"] is True
+    assert "statefp" not in result[0]
+    assert list(result.lat) == [r["lat"] for r in rows]
+
+    # duplicates and cache hits are merged column by column under their own ids
+    async with AsyncCensusGeocode(
+        transport=_batch_transport(), cache=MemoryCache()
+    ) as acg:
+        await acg.addressbatch(DUPLICATED[:2], returntype="locations")
+        rows = await acg.addressbatch(DUPLICATED, dedupe=True, returntype="locations")
+        result = await acg.addressbatch(
+            DUPLICATED, dedupe=True, returntype="locations", compact=True
+        )
+    assert isinstance(result, BatchResult)
+    assert [r["id"] for r in result] == ["a", "b", "c", "d", "e"]
+    assert result == rows
+
+
+def test_batch_result_columns():
+    rows = [
+        {
+            "id": "1",
+            "match": True,
+            "matchtype": "Exact",
+            "statefp": "36",
+            "lat": 40.7,
+            "lon": -73.9,
+        },
+        {
+            "id": "2",
+            "match": False,
+            "matchtype": None,
+            "statefp": None,
+            "lat": None,
+            "lon": None,
+        },
+    ]
+    result = BatchResult.from_rows(rows)
+    assert bytes(result.match) == b"\x01\x00"
+    assert result[1]["lat"] is None and result[1]["match"] is False
+    assert result[0].statefp == "36"
+    assert dict(result[0])["lon"] == -73.9
+    assert [r["id"] for r in result[::-1]] == ["2", "1"]
+    assert len(BatchResult.concat([result, result])) == 4
+    with pytest.raises(IndexError):
+        result[2]
+
+
+BATCH_CSV = (
+    '1,"1 MAIN ST",Match,Exact,"1 MAIN ST","-73.9,40.7",1,L,36,061,000100,1000\n'
+    '2,"2 MAIN ST",No_Match\n'
+    '3,"3 MAIN ST",Tie,,,,,\n'
+    '4,"4 MAIN ST",Match,Non_Exact,"4 MAIN ST","bad",2,R,36,047,000200,2000\n'
+)
+
+
+def test_batch_result_from_csv():
+    acg = AsyncCensusGeocode()
+    result = BatchResult.from_csv(BATCH_CSV)
+    rows = acg._parse_batch_result(BATCH_CSV, "geographies")
+    # the dict rows keep an empty coordinate field
+    assert list(result) == [
+        {k: v for k, v in row.items() if k != "coordinate"} for row in rows
+    ]
+    assert result[1]["tract"] is None
+    assert result[3]["lat"] is None
+
+
+def test_batch_result_exports():
+    np = pytest.importorskip("numpy")
+    result = BatchResult.from_csv(BATCH_CSV)
+
+    columns = result.to_numpy()
+    assert columns["lat"].dtype == np.float64
+    assert columns["match"].tolist() == [True, False, False, True]
+    assert np.isnan(columns["lon"][1])
+    assert columns["tract"][0] == "000100"
+
+    pd = pytest.importorskip("pandas")
+    df = result.to_pandas()
+    assert list(df.columns) == list(result.fields)
+    assert df["lat"].dtype == "float64"
+    assert df["match"].dtype == bool
+    assert isinstance(df["matchtype"].dtype, pd.CategoricalDtype)
+    assert df["statefp"].dtype == "string"
+    assert df["countyfp"].tolist()[0] == "061"
+
+    pa = pytest.importorskip("pyarrow")
+    table = result.to_arrow()
+    assert table.column_names == list(result.fields)
+    assert table.schema.field("lat").type == pa.float64()
+    assert table.column("lat").null_count == 3
+    assert pa.types.is_dictionary(table.schema.field("side").type)
+    assert table.column("block").to_pylist() == ["1000", None, None, "2000"]
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_iter_compact():
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 8)]
+    async with AsyncCensusGeocode(transport=_batch_transport()) as acg:
+        parts = [
+            part
+            async for part in acg.addressbatch_iter(
+                data, chunksize=3, returntype="locations", compact=True
+            )
+        ]
+    assert [len(part) for part in parts] == [3, 3, 1]
+    assert all(isinstance(part, BatchResult) for part in parts)
+    assert [r["id"] for r in parts[0]] == ["3", "2", "1"]
+    assert parts[2].to_numpy()["lat"].tolist() == [40.7]
+
+
+def _geography_payload():
+    layers = {
+        name: [{"GEOID": name, "CENTLON": "-77.0", "CENTLAT": "38.9"}]
+        for name in ("Census Tracts", "2020 Census Blocks", "Counties", "States")
+    }
+    layers["States"][0]["CENTLON"] = ""
+    return {"result": {"input": {}, "geographies": layers}}
+
+
+def test_geography_result_lazy():
+    result = GeographyResult(_geography_payload())
+    raw = dict.__getitem__(result, "Counties")
+    assert "CENT" not in raw[0]
+    assert result["Counties"][0]["CENT"] == (-77.0, 38.9)
+    assert "CENT" not in dict.__getitem__(result, "Census Tracts")[0]
+    assert result.get("States")[0]["CENT"] == ()
+
+    copied = pickle.loads(pickle.dumps(GeographyResult(_geography_payload())))
+    assert dict(copied)["Census Tracts"][0]["INTPT"] == ()
+    assert all("CENT" in layer[0] for layer in copied.values())
+    assert GeographyResult(_geography_payload()) == copied
+
+
+@pytest.mark.asyncio
+async def test_coordinates_layers_filter():
+    wanted = ["Census Tracts", "2020 Census Blocks"]
+    transport = _json_transport(_geography_payload())
+    async with AsyncCensusGeocode(
+        transport=transport, layers=wanted, cache=MemoryCache()
+    ) as acg:
+        result = await acg.coordinates(-77, 38.9)
+    assert sorted(result) == sorted(wanted)
+    assert result["Census Tracts"][0]["CENT"] == (-77.0, 38.9)
+
+
+@pytest.mark.asyncio
+async def test_custom_decoder():
+    calls = []
+
+    def decoder(content):
+        calls.append(content)
+        return json.loads(content)
+
+    transport = _json_transport(ADDRESS_PAYLOAD)
+    async with AsyncCensusGeocode(transport=transport, decoder=decoder) as acg:
+        result = await acg.onelineaddress("foo")
+    assert result[0]["matchedAddress"] == "foo"
+    assert len(calls) == 1 and isinstance(calls[0], bytes)
+
+
+@pytest.mark.asyncio
+async def test_schema_decoder():
+    pytest.importorskip("msgspec")
+    decoder = schema_decoder(layers=["Census Tracts", "Counties"], attributes=["GEOID"])
+    payload = _geography_payload()
+    payload["result"]["geographies"]["Census Tracts"][0]["NAME"] = "Tract 1"
+    async with AsyncCensusGeocode(
+        transport=_json_transport(payload), decoder=decoder
+    ) as acg:
+        result = await acg.coordinates(-77, 38.9)
+    assert sorted(result) == ["Census Tracts", "Counties"]
+    assert "NAME" not in result["Census Tracts"][0]
+    assert result["Census Tracts"][0]["GEOID"] == "Census Tracts"
+    assert result["Counties"][0]["CENT"] == (-77.0, 38.9)
+
+    decoder = schema_decoder(match_fields=["matchedAddress"])
+    content = json.dumps(ADDRESS_PAYLOAD).encode()
+    assert decoder(content)["result"]["addressMatches"] == [{"matchedAddress": "foo"}]
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_iter_completion_order():
+    answer = _batch_transport().handler
+
+    async def handler(request):
+        response = answer(request)
+        # the first chunk, rows 1 to 3, comes back reversed
+        if response.text.startswith("3,"):
+            await asyncio.sleep(0.2)
+        return response
+
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 8)]
+    async with AsyncCensusGeocode(transport=httpx.MockTransport(handler)) as acg:
+        rows = [
+            row["id"]
+            async for row in acg.addressbatch_iter(
+                data, chunksize=3, returntype="locations", ordered=False
+            )
+        ]
+        with pytest.raises(ValueError):
+            async for part in acg.addressbatch_iter(data, compact=True, ordered=False):
+                pass
+    # the first chunk is slowest, so its rows come last
+    assert sorted(rows[-3:]) == ["1", "2", "3"]
+    assert sorted(rows) == [str(i) for i in range(1, 8)]
+
+
+def _failing_after(transport, uploads):
+    """Wrap a batch transport to fail every upload after the first"""
+
+    def handler(request):
+        if uploads:
+            raise httpx.ConnectError("down")
+        return transport.handler(request)
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_checkpoint(tmp_path):
+    path = str(tmp_path / "job.sqlite")
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 6)]
+    uploads = []
+    transport = _failing_after(_batch_transport(uploads), uploads)
+    async with AsyncCensusGeocode(transport=transport) as acg:
+        with pytest.raises(httpx.ConnectError):
+            await acg.addressbatch(
+                data,
+                chunksize=2,
+                concurrency=1,
+                returntype="locations",
+                checkpoint=path,
+            )
+
+    journal = BatchJournal(path)
+    assert journal.status() == {"completed": 1, "submitted": 1}
+
+    uploads = []
+    async with AsyncCensusGeocode(transport=_batch_transport(uploads)) as acg:
+        result = await acg.addressbatch(
+            data, chunksize=2, concurrency=1, returntype="locations", checkpoint=journal
+        )
+        assert uploads == [["3", "4"], ["5"]]
+        assert [row["id"] for row in result] == ["1", "2", "3", "4", "5"]
+        assert journal.status() == {"completed": 3}
+
+        rows = [
+            row["id"]
+            async for row in acg.addressbatch_iter(
+                data, chunksize=2, returntype="locations", checkpoint=journal
+            )
+        ]
+        assert uploads == [["3", "4"], ["5"]]
+        assert rows == ["1", "2", "3", "4", "5"]
+
+        with pytest.raises(ValueError):
+            await acg.addressbatch(
+                data[1:], chunksize=2, returntype="locations", checkpoint=journal
+            )
+    journal.close()
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_iter_checkpoint(tmp_path):
+    path = str(tmp_path / "job.sqlite")
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 6)]
+    uploads = []
+    async with AsyncCensusGeocode(transport=_batch_transport(uploads)) as acg:
+        first = [
+            row["id"]
+            async for row in acg.addressbatch_iter(
+                data, chunksize=2, returntype="locations", checkpoint=path
+            )
+        ]
+        second = [
+            row["id"]
+            async for row in acg.addressbatch_iter(
+                data, chunksize=2, returntype="locations", checkpoint=path
+            )
+        ]
+    assert len(uploads) == 3
+    assert first == second == ["2", "1", "4", "3", "5"]
+
+
+def test_batch_upload_file():
+    rows = [[i, "{} Main St".format(i), "Town, IL", "IL", ""] for i in range(1200)]
+    expected = io.StringIO()
+    csv.writer(expected).writerows(rows)
+    expected = expected.getvalue().encode()
+
+    f = AsyncCensusGeocode._batch_file(rows)
+    assert f.seek(0, io.SEEK_END) == len(expected)
+    f.seek(0)
+    assert f.read(100) == expected[:100]
+    assert f.read() == expected[100:]
+    f.seek(0)
+    assert io.TextIOWrapper(f, encoding="utf-8", newline="").read() == expected.decode()
+
+
+@pytest.mark.asyncio
+async def test_addressbatch_async_generator():
+    uploads, lengths = [], []
+    answer = _batch_transport(uploads).handler
+
+    def handler(request):
+        lengths.append(request.headers.get("Content-Length"))
+        return answer(request)
+
+    async def addresses():
+        for i in range(1, 6):
+            await asyncio.sleep(0)
+            yield {"street": "{} Main St".format(i)}
+
+    async with AsyncCensusGeocode(transport=httpx.MockTransport(handler)) as acg:
+        result = await acg.addressbatch(
+            addresses(), chunksize=2, returntype="locations"
+        )
+    assert uploads == [["1", "2"], ["3", "4"], ["5"]]
+    assert [row["id"] for row in result] == ["1", "2", "3", "4", "5"]
+    assert all(lengths)
+
+
+def _status_transport():
+    """MockTransport answering batch uploads with a Match, No_Match and Tie row"""
+
+    def handler(request):
+        return httpx.Response(
+            200,
+            text=(
+                '1,"1 MAIN ST",Match,Exact,,"-73.9,40.7",1,L\n'
+                '2,"2 MAIN ST",No_Match\n'
+                '3,"3 MAIN ST",Tie\n'
+            ),
+        )
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_metrics_collector():
+    metrics = MetricsCollector()
+    events = []
+    hooks = [metrics, lambda event, fields: events.append(event)]
+    async with AsyncCensusGeocode(
+        transport=_json_transport(ADDRESS_PAYLOAD), cache=MemoryCache(), hooks=hooks
+    ) as acg:
+        await acg.onelineaddress("foo")
+        await acg.onelineaddress("foo")
+    assert events == ["cache", "request_start", "request_end", "parse", "cache"]
+    assert metrics.counters["requests"] == 1
+    assert metrics.counters["cache_hits"] == metrics.counters["cache_misses"] == 1
+    assert metrics.counters["bytes_received"] > 0
+    assert metrics.percentile("network", "onelineaddress", 0.5) is not None
+
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 4)]
+    async with AsyncCensusGeocode(
+        transport=_status_transport(), hooks=[metrics]
+    ) as acg:
+        await acg.addressbatch(data, returntype="locations")
+        async for row in acg.addressbatch_iter(data, returntype="locations"):
+            pass
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["rows_sent"] == 6
+    assert snapshot["counters"]["matched"] == 2
+    assert snapshot["counters"]["unmatched"] == 2
+    assert snapshot["counters"]["tied"] == 2
+    assert snapshot["latency"]["network"]["addressbatch"]["count"] == 2
+    assert snapshot["latency"]["parse"]["addressbatch"]["count"] == 2
+    assert metrics.rate("requests") > 0
+
+
+@pytest.mark.asyncio
+async def test_metrics_retries():
+    metrics = MetricsCollector()
+    handler = _flaky(
+        lambda request: httpx.Response(200, json=ADDRESS_PAYLOAD), [503, 503]
+    )
+    async with AsyncCensusGeocode(
+        transport=httpx.MockTransport(handler),
+        retry=RetryPolicy(attempts=3, backoff=0),
+        hooks=[metrics],
+    ) as acg:
+        await acg.onelineaddress("foo")
+    assert metrics.counters["requests"] == 3
+    assert metrics.counters["errors"] == 2
+    assert metrics.counters["retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_timing_excludes_consumer():
+    metrics = MetricsCollector()
+    limiter = AdaptiveLimiter()
+    async with AsyncCensusGeocode(
+        transport=_status_transport(), hooks=[metrics], limiter=limiter
+    ) as acg:
+        rows = [[i, "{} Main St".format(i), "", "", ""] for i in range(1, 4)]
+        async for row in acg._stream_batch(
+            acg._batch_file(rows), returntype="locations"
+        ):
+            await asyncio.sleep(0.05)
+    # a slow consumer is not a slow Census
+    assert metrics.percentile("network", "addressbatch", 0.5) < 0.05
+    assert limiter._baseline["addressbatch"] < 0.05
+
+
+@pytest.mark.asyncio
+async def test_failing_hook_is_logged(caplog):
+    def broken(event, fields):
+        raise RuntimeError("broken hook")
+
+    async with AsyncCensusGeocode(
+        transport=_json_transport(ADDRESS_PAYLOAD), hooks=[broken]
+    ) as acg:
+        result = await acg.onelineaddress("foo")
+    assert len(result) == 1
+    assert "broken hook" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_opentelemetry_hook():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+    reader = InMemoryMetricReader()
+    meter = MeterProvider(metric_readers=[reader]).get_meter("test")
+    hook = OpenTelemetryHook(meter)
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 4)]
+    async with AsyncCensusGeocode(transport=_status_transport(), hooks=[hook]) as acg:
+        await acg.addressbatch(data, returntype="locations")
+
+    metrics = {
+        metric.name: metric
+        for resource in reader.get_metrics_data().resource_metrics
+        for scope in resource.scope_metrics
+        for metric in scope.metrics
+    }
+    assert metrics["census.requests"].data.data_points[0].value == 1
+    rows = {
+        point.attributes["status"]: point.value
+        for point in metrics["census.batch.rows"].data.data_points
+    }
+    assert rows == {"matched": 1, "unmatched": 1, "tied": 1}
+
+
+@pytest.mark.asyncio
+async def test_replay_transport(tmp_path):
+    path = str(tmp_path / "archive.sqlite")
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.path.endswith("addressbatch"):
+            return _batch_transport().handler(request)
+        return httpx.Response(200, json=_geography_payload())
+
+    recorder = ReplayTransport(
+        path, mode="record", transport=httpx.MockTransport(handler)
+    )
+    data = [{"street": "{} Main St".format(i)} for i in range(1, 4)]
+    async with AsyncCensusGeocode(transport=recorder) as acg:
+        recorded = await acg.coordinates(-74, 43)
+        batch = await acg.addressbatch(data, returntype="locations")
+    assert len(requests) == 2
+    assert len(recorder) == 2
+    recorder.close()
+
+    replayer = ReplayTransport(path)
+    async with AsyncCensusGeocode(transport=replayer) as acg:
+        # Keys are normalized, and multipart boundaries differ between uploads
+        assert await acg.coordinates(-74.0, "43") == recorded
+        assert await acg.addressbatch(data, returntype="locations") == batch
+        with pytest.raises(httpx.TransportError):
+            await acg.coordinates(-75, 43)
+    assert len(requests) == 2
+
+    # A plain httpx client can use it as its transport, too
+    async with httpx.AsyncClient(transport=replayer) as client:
+        acg = AsyncCensusGeocode(client=client)
+        assert await acg.coordinates(-74, 43) == recorded
+    replayer.close()
+
+    with pytest.raises(ValueError):
+        ReplayTransport(path, mode="rewind")
+
+
+def test_sync_facade():
+    threads = set()
+
+    def handler(request):
+        threads.add(threading.current_thread().name)
+        if request.url.path.endswith("addressbatch"):
+            return _batch_transport().handler(request)
+        address = request.url.params.get("address", "")
+        if "bad" in address:
+            return httpx.Response(400, text="bad address")
+        return httpx.Response(
+            200, json={"result": {"addressMatches": [{"matchedAddress": address}]}}
+        )
+
+    with CensusGeocode(transport=httpx.MockTransport(handler)) as cg:
+        assert cg.onelineaddress("1 Main St")[0]["matchedAddress"] == "1 Main St"
+        rows = cg.addressbatch([{"street": "1 Main St"}], returntype="locations")
+        assert rows[0]["id"] == "1"
+
+        def bulk(n):
+            addresses = ["{} {} Main St".format(n, i) for i in range(5)] + ["bad"]
+            return list(cg.geocode_many(addresses, concurrency=3))
+
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(bulk, range(4)))
+        for n, pairs in enumerate(results):
+            assert [address for address, _ in pairs][:2] == [
+                "{} 0 Main St".format(n),
+                "{} 1 Main St".format(n),
+            ]
+            assert isinstance(pairs[-1][1], ValueError)
+        client = cg._geocoder._client
+
+    # Every request ran on the one background loop, with one client
+    assert threads == {"CensusGeocode"}
+    assert client.is_closed
+    assert cg._loop is None
+
+
+def _import_times(code, **env):
+    """Run code with -X importtime, giving the cumulative microseconds of each module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, **env),
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:") :].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_time():
+    src = os.path.join(os.path.dirname(__file__), "..", "src")
+    times = _import_times("import async_censusgeocode", PYTHONPATH=src)
+    assert "async_censusgeocode" in times
+    # httpx, asyncio and sqlite3 are imported on first use
+    assert not {"httpx", "asyncio", "sqlite3"} & set(times)
+    # Generous budget, which includes compiling the module when there is no .pyc
+    assert times["async_censusgeocode"] < 150000
+
+
+def test_lazy_module_caches_attributes():
+    lazy = _LazyModule("json")
+    assert lazy.dumps is json.dumps
+    # later accesses are plain attribute lookups
+    assert vars(lazy)["dumps"] is json.dumps
+
+
+@pytest.mark.asyncio
+async def test_coalesce_identical_lookups():
+    seen = []
+    metrics = MetricsCollector()
+    async with AsyncCensusGeocode(
+        transport=_oneline_transport(seen), hooks=[metrics]
+    ) as acg:
+        results = await asyncio.gather(
+            acg.onelineaddress("slow 1 Main St"),
+            acg.onelineaddress("SLOW 1 main  st"),
+            acg.onelineaddress("slow 1 Main St"),
+            acg.onelineaddress("slow 2 Main St"),
+        )
+        assert len(seen) == 2
+        assert results[0] is results[1] is results[2]
+        assert metrics.counters["coalesced"] == 2
+
+        # Finished requests are forgotten
+        await acg.onelineaddress("slow 1 Main St")
+        assert len(seen) == 3
+
+    seen = []
+    async with AsyncCensusGeocode(
+        transport=_oneline_transport(seen), coalesce=False
+    ) as acg:
+        await asyncio.gather(*(acg.onelineaddress("slow 1 Main St") for _ in range(3)))
+    assert len(seen) == 3
+
+
+@pytest.mark.asyncio
+async def test_coalesce_errors_and_cancellation():
+    seen = []
+    async with AsyncCensusGeocode(transport=_oneline_transport(seen, 503)) as acg:
+        results = await asyncio.gather(
+            acg.onelineaddress("slow 1 Main St"),
+            acg.onelineaddress("slow 1 Main St"),
+            return_exceptions=True,
+        )
+    assert len(seen) == 1
+    assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+
+    seen = []
+    async with AsyncCensusGeocode(transport=_oneline_transport(seen)) as acg:
+        first = asyncio.ensure_future(acg.onelineaddress("slow 1 Main St"))
+        second = asyncio.ensure_future(acg.onelineaddress("slow 1 Main St"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await second
+        assert result[0]["matchedAddress"] == "slow 1 Main St"
+        assert first.cancelled()
+
+        # The last caller to give up cancels the request
+        only = asyncio.ensure_future(acg.onelineaddress("slow 3 Main St"))
+        await asyncio.sleep(0.01)
+        [(request, _)] = acg._inflight.values()
+        only.cancel()
+        # A caller arriving while it is cancelled sends a new request
+        again = asyncio.ensure_future(acg.onelineaddress("slow 3 Main St"))
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        result = await again
+        assert result[0]["matchedAddress"] == "slow 3 Main St"
+        assert not acg._inflight
+    assert len(seen) == 3
+
+
+def _microbatch_transport(seen, status=200, ties=()):
+    """MockTransport answering batch uploads as _batch_transport does, adding block
+    codes to geographies rows and making the rows of ids in ties a Tie, and single
+    address lookups with one match"""
+    batch = _batch_transport().handler
+
+    def handler(request):
+        seen.append(request.url.path.rsplit("/", 1)[-1])
+        if status != 200:
+            return httpx.Response(status)
+        if request.url.path.endswith("addressbatch"):
+            lines = []
+            for line in batch(request).text.splitlines():
+                i = line.split(",", 1)[0]
+                if i in ties:
+                    line = '{0},"{0} MAIN ST",Tie'.format(i)
+                elif "/geographies/" in request.url.path:
+                    line += ",36,061,000100,100{}".format(i)
+                lines.append(line + "\n")
+            return httpx.Response(200, text="".join(lines))
+        street = request.url.params["street"]
+        return httpx.Response(
+            200, json={"result": {"addressMatches": [{"matchedAddress": street}]}}
+        )
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_microbatch():
+    seen = []
+    async with AsyncCensusGeocode(
+        transport=_microbatch_transport(seen),
+        microbatch=MicroBatch(window=0.01, max_rows=4),
+    ) as acg:
+        streets = ["{} Main St".format(i) for i in range(5)]
+        results = await asyncio.gather(*(acg.address(street) for street in streets))
+        # Four rows fill a batch; the fifth is left alone when the window closes
+        assert seen == ["addressbatch", "address"]
+        for street, result in zip(streets, results):
+            assert isinstance(result, AddressResult)
+            assert result[0]["matchedAddress"].upper() == street.upper()
+        block = results[1][0]["geographies"]["2020 Census Blocks"][0]
+        assert block == {
+            "STATE": "36",
+            "COUNTY": "061",
+            "TRACT": "000100",
+            "BLOCK": "1001",
+            "GEOID": "360610001001001",
+        }
+        assert results[0][0]["coordinates"] == {"x": -73.9, "y": 40.7}
+        assert results[0].input == {"address": {"street": "0 Main St"}}
+
+    seen = []
+    async with AsyncCensusGeocode(
+        transport=_microbatch_transport(seen, 503),
+        microbatch=MicroBatch(window=0.01),
+    ) as acg:
+        results = await asyncio.gather(
+            acg.address("1 Main St"), acg.address("2 Main St"), return_exceptions=True
+        )
+    assert seen == ["addressbatch"]
+    assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+
+    with pytest.raises(ValueError):
+        MicroBatch(max_rows=20000)
+
+
+@pytest.mark.asyncio
+async def test_microbatch_ties_and_layers():
+    seen, timeouts = [], []
+    handler = _microbatch_transport(seen, ties={"1"}).handler
+
+    def record(request):
+        timeouts.append(request.extensions["timeout"]["read"])
+        return handler(request)
+
+    async with AsyncCensusGeocode(
+        transport=httpx.MockTransport(record), microbatch=MicroBatch(window=0.01)
+    ) as acg:
+        results = await asyncio.gather(
+            acg.address("0 Main St", timeout=5), acg.address("1 Main St", timeout=5)
+        )
+    # A Tie is looked up on its own, for its candidate matches
+    assert seen == ["addressbatch", "address"]
+    assert timeouts == [5, 5]
+    assert results[0][0]["matchedAddress"] == "0 MAIN ST"
+    assert results[1][0]["matchedAddress"] == "1 Main St"
+
+    for layers, expected in (
+        (["Census Tracts"], {}),
+        (["Census Tracts", "2020 Census Blocks"], {"2020 Census Blocks"}),
+    ):
+        async with AsyncCensusGeocode(
+            transport=_microbatch_transport([]),
+            microbatch=MicroBatch(window=0.01),
+            layers=layers,
+        ) as acg:
+            results = await asyncio.gather(
+                acg.address("0 Main St"), acg.address("1 Main St")
+            )
+        assert set(results[0][0].get("geographies", {})) == set(expected)
+
+    # Batch-built results don't answer a shared cache's plain lookups
+    seen, cache = [], MemoryCache()
+    async with AsyncCensusGeocode(
+        transport=_microbatch_transport(seen),
+        microbatch=MicroBatch(window=0.01),
+        cache=cache,
+    ) as acg:
+        await asyncio.gather(acg.address("0 Main St"), acg.address("1 Main St"))
+        await acg.address("0 Main St")
+    async with AsyncCensusGeocode(
+        transport=_microbatch_transport(seen), cache=cache
+    ) as acg:
+        result = await acg.address("0 Main St")
+    assert seen == ["addressbatch", "address"]
+    assert result[0]["matchedAddress"] == "0 Main St"
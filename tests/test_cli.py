@@ -4,7 +4,12 @@ import csv
 import pytest
 from unittest.mock import patch, AsyncMock
 
+import functools
 import importlib
+import os
+import subprocess
+
+import httpx
 
 
 @pytest.mark.asyncio
@@ -57,3 +62,158 @@ async def test_cli_csv(monkeypatch, tmp_path):
             main_mod = importlib.import_module("src.cli")
             main_mod.main()
         output = buf.getvalue()
+
+
+def _batch_handler(request):
+    body = request.read().decode()
+    rows = list(csv.reader(io.StringIO(body.split("\r\n\r\n", 2)[-1])))
+    lines = [
+        '{},"{}",Match,Exact,,"-73.9,40.7",1,L\n'.format(row[0], row[1])
+        for row in rows
+        if len(row) == 5
+    ]
+    return httpx.Response(200, text="".join(reversed(lines)))
+
+
+@pytest.mark.asyncio
+async def test_cli_csv_stream(monkeypatch):
+    cli = importlib.import_module("src.cli")
+    acg_module = importlib.import_module("src.async_censusgeocode")
+    monkeypatch.setattr(
+        cli,
+        "AsyncCensusGeocode",
+        functools.partial(
+            acg_module.AsyncCensusGeocode,
+            transport=httpx.MockTransport(_batch_handler),
+        ),
+    )
+    stdin = "".join(
+        "{},{} Main St,Springfield,IL,62701\n".format(i, i) for i in range(1, 6)
+    )
+    monkeypatch.setattr(sys, "stdin", io.StringIO(stdin))
+    monkeypatch.setattr(
+        sys, "argv", ["cli", "--csv", "-", "--chunk-size", "2", "--concurrency", "2"]
+    )
+    out = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", out)
+
+    await cli.main()
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    # rows within each chunk are put back in input order
+    assert [row["id"] for row in rows] == ["1", "2", "3", "4", "5"]
+    assert rows[0]["lat"] == "40.7"
+
+
+def _oneline_handler(request):
+    address = request.url.params["address"]
+    matches = []
+    if address != "nowhere":
+        matches.append(
+            {
+                "matchedAddress": address.upper(),
+                "coordinates": {"x": -77.0, "y": 38.9},
+                "geographies": {"Census Tracts": [{"GEOID": "11001006202"}]},
+            }
+        )
+    return httpx.Response(200, json={"result": {"addressMatches": matches}})
+
+
+@pytest.mark.asyncio
+async def test_cli_oneline_file(monkeypatch, tmp_path):
+    cli = importlib.import_module("src.cli")
+    acg_module = importlib.import_module("src.async_censusgeocode")
+    monkeypatch.setattr(
+        cli,
+        "AsyncCensusGeocode",
+        functools.partial(
+            acg_module.AsyncCensusGeocode,
+            transport=httpx.MockTransport(_oneline_handler),
+        ),
+    )
+    path = tmp_path / "addresses.txt"
+    path.write_text("1600 Pennsylvania Ave, Washington DC\n\nnowhere\n")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["cli", "--oneline-file", str(path), "--field", "Census Tracts:GEOID"],
+    )
+    out = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", out)
+
+    await cli.main()
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert rows[0]["address"] == "1600 Pennsylvania Ave, Washington DC"
+    assert rows[0]["match"] == "True"
+    assert rows[0]["lon"] == "-77.0"
+    assert rows[0]["Census Tracts:GEOID"] == "11001006202"
+    assert rows[1] == {
+        "address": "nowhere",
+        "match": "False",
+        "lon": "",
+        "lat": "",
+        "Census Tracts:GEOID": "",
+    }
+
+
+@pytest.mark.asyncio
+async def test_cli_closes_only_its_own(monkeypatch, tmp_path):
+    cli = importlib.import_module("src.cli")
+    acg_module = importlib.import_module("src.async_censusgeocode")
+    monkeypatch.setattr(
+        cli,
+        "AsyncCensusGeocode",
+        functools.partial(
+            acg_module.AsyncCensusGeocode,
+            transport=httpx.MockTransport(_oneline_handler),
+        ),
+    )
+    closed = []
+    monkeypatch.setattr(cli.SQLiteCache, "close", lambda self: closed.append(self))
+    cache = str(tmp_path / "cache.sqlite")
+    monkeypatch.setattr(sys, "stdout", io.StringIO())
+
+    # standard input is left open
+    stdin = io.StringIO("1600 Pennsylvania Ave, Washington DC\n")
+    monkeypatch.setattr(sys, "stdin", stdin)
+    monkeypatch.setattr(sys, "argv", ["cli", "--oneline-file", "-", "--cache", cache])
+    await cli.main()
+    assert not stdin.closed
+    assert len(closed) == 1
+
+    # the cache is closed when the address is not found
+    monkeypatch.setattr(sys, "argv", ["cli", "nowhere", "--cache", cache])
+    monkeypatch.setattr(sys, "stderr", io.StringIO())
+    with pytest.raises(SystemExit):
+        await cli.main()
+    assert len(closed) == 2
+
+    # and so is the connection pool of a single lookup
+    clients = []
+    aclose = acg_module.AsyncCensusGeocode.aclose
+
+    async def record(self):
+        clients.append(self._client)
+        await aclose(self)
+
+    monkeypatch.setattr(acg_module.AsyncCensusGeocode, "aclose", record)
+    monkeypatch.setattr(sys, "argv", ["cli", "1600 Pennsylvania Ave"])
+    await cli.main()
+    assert clients and clients[0].is_closed
+
+
+def test_cli_version_imports():
+    root = os.path.join(os.path.dirname(__file__), "..")
+    code = (
+        "import sys\n"
+        "sys.argv = ['async-censusgeocode', '--version']\n"
+        "import src.cli\n"
+        "try:\n"
+        "    src.cli.run()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(sorted({'httpx', 'asyncio', 'sqlite3'} & set(sys.modules)))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, cwd=root
+    )
+    assert result.stdout.splitlines() == ["async-censusgeocode v0.1.0", "[]"]